@@ -23,11 +23,13 @@ if FILENAME not in project_dir_content:
         f'Убедитесь, что у вас верная структура проекта.'
     )
 
+import pytest
 from django.utils.version import get_version
 
 assert get_version() < '3.0.0', 'Пожалуйста, используйте версию Django < 3.0.0'
 
 from yatube.settings import INSTALLED_APPS
+from core.testing import isolated_caches
 
 assert any(app in INSTALLED_APPS for app in ['posts.apps.PostsConfig', 'posts']), (
     'Пожалуйста зарегистрируйте приложение в `settings.INSTALLED_APPS`'
@@ -37,3 +39,17 @@ pytest_plugins = [
     'tests.fixtures.fixture_user',
     'tests.fixtures.fixture_data',
 ]
+
+
+@pytest.fixture(autouse=True)
+def synchronous_thumbnails(settings):
+    # Пул миниатюр пишет в MEDIA_ROOT уже после ответа и мешает
+    # тестам удалять временный каталог с медиафайлами.
+    settings.THUMBNAIL_WORKERS = 0
+
+
+@pytest.fixture(autouse=True)
+def isolated_cache(settings, tmp_path):
+    # Версии областей и фрагменты не должны переживать тест
+    # и попадать в кэш запущенного рядом сервера.
+    settings.CACHES = isolated_caches(str(tmp_path))
@@ -0,0 +1,69 @@
+import statistics
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает объём и время ответа HTML-страниц и тех же '
+            'данных из API: главная, группа, профиль и пост.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument(
+            '--warm', action='store_true',
+            help='Не очищать кэш перед запросами: замер с кэшем '
+                 'фрагментов, а не полной отрисовки.')
+
+    def handle(self, *args, **options):
+        post = Post.objects.select_related('author').filter(
+            group__isnull=False).order_by('-pub_date').first()
+        if post is None:
+            raise CommandError('Нужен хотя бы один пост в группе.')
+        group = Group.objects.get(pk=post.group_id)
+        author = post.author.username
+        pages = [
+            ('главная', reverse('posts:index'), [reverse('api:post_list')]),
+            ('группа', reverse('posts:group_list', args=[group.slug]),
+             [f'{reverse("api:post_list")}?group={group.slug}']),
+            ('профиль', reverse('posts:profile', args=[author]),
+             [f'{reverse("api:post_list")}?author={author}']),
+            ('пост', reverse('posts:post_detail', args=[post.pk]),
+             [reverse('api:post_detail', args=[post.pk]),
+              reverse('api:comment_list', args=[post.pk])]),
+        ]
+        # Адрес не из INTERNAL_IPS: панель отладки не попадёт в HTML.
+        client = Client(REMOTE_ADDR='192.0.2.1')
+        for label, html_url, api_urls in pages:
+            html_bytes, html_ms = self.measure(
+                client, [html_url], options['repeat'], options['warm'])
+            api_bytes, api_ms = self.measure(
+                client, api_urls, options['repeat'], options['warm'])
+            self.stdout.write(
+                f'{label}: HTML {html_bytes} Б, {html_ms:.1f} мс / '
+                f'API {api_bytes} Б, {api_ms:.1f} мс '
+                f'(в {html_bytes / max(api_bytes, 1):.1f} раза меньше)')
+
+    @staticmethod
+    def measure(client, urls, repeat, warm):
+        """Байты и медиана времени ответов на все urls, мс."""
+        timings = []
+        size = 0
+        for _ in range(repeat):
+            if not warm:
+                cache.clear()
+            started = time.perf_counter()
+            size = 0
+            for url in urls:
+                response = client.get(url)
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'{url}: ответ {response.status_code}')
+                size += len(response.content)
+            timings.append((time.perf_counter() - started) * 1000)
+        return size, statistics.median(timings)
@@ -0,0 +1,106 @@
+"""Ресурсы API: публичные поля и пути к ним в ORM.
+
+Ответ собирается из values() по путям только запрошенных полей
+(?fields=), поэтому СУБД читает лишь нужные столбцы, а объекты
+моделей не создаются.
+"""
+from django.db.models.fields.files import FieldFile
+
+from posts.models import Post
+
+
+def image_url(name):
+    return Post._meta.get_field('image').storage.url(name) if name else None
+
+
+class Resource:
+    def __init__(self, fields, key, transforms=None):
+        self.fields = fields
+        self.key = key
+        self.transforms = transforms or {}
+
+    def select(self, raw):
+        """Имена полей из значения ?fields=; все поля, если оно пустое."""
+        if not raw:
+            return list(self.fields)
+        names = list(dict.fromkeys(
+            name.strip() for name in raw.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.fields]
+        if unknown:
+            raise ValueError(f'Неизвестные поля: {", ".join(unknown)}.')
+        return names
+
+    def values(self, queryset, names):
+        # Ключ и pk нужны курсору, даже если их не запросили.
+        paths = {self.fields[name] for name in names} | {self.key, 'pk'}
+        return queryset.values(*paths)
+
+    def objects(self, queryset):
+        """Queryset объектов со всеми полями ресурса и только с ними."""
+        related = {path.rsplit('__', 1)[0] for path in self.fields.values()
+                   if '__' in path}
+        return queryset.select_related(*related).only(
+            *(path for path in self.fields.values() if path != 'pk'))
+
+    def row(self, obj):
+        """Словарь как у values() по всем полям ресурса для объекта."""
+        row = {}
+        for path in {*self.fields.values(), self.key, 'pk'}:
+            value = obj
+            for attr in path.split('__'):
+                value = getattr(value, attr) if value is not None else None
+            row[path] = value.name if isinstance(value, FieldFile) else value
+        return row
+
+    def serialize(self, row, names):
+        data = {}
+        for name in names:
+            value = row[self.fields[name]]
+            transform = self.transforms.get(name)
+            data[name] = transform(value) if transform else value
+        return data
+
+
+POSTS = Resource({
+    'id': 'pk',
+    'text': 'text',
+    'pub_date': 'pub_date',
+    'author': 'author__username',
+    'group': 'group__slug',
+    'image': 'image',
+    'image_width': 'image_width',
+    'image_height': 'image_height',
+    'image_color': 'image_color',
+    'comments_count': 'comments_count',
+}, key='pub_date', transforms={'image': image_url})
+
+# Комментарий меняет версию только своего поста, а не версии лент, и
+# ETag списка не заметил бы нового comments_count. Поэтому в списках
+# постов этого поля нет: оно есть в посте и в batch.
+POST_LIST = Resource(
+    {name: path for name, path in POSTS.fields.items()
+     if name != 'comments_count'},
+    key=POSTS.key, transforms=POSTS.transforms)
+
+COMMENTS = Resource({
+    'id': 'pk',
+    'post': 'post_id',
+    'author': 'author__username',
+    'text': 'text',
+    'created': 'created',
+}, key='created')
+
+GROUPS = Resource({
+    'id': 'pk',
+    'slug': 'slug',
+    'title': 'title',
+    'description': 'description',
+    'created': 'created',
+}, key='created')
+
+FOLLOWS = Resource({
+    'id': 'pk',
+    'user': 'user__username',
+    'author': 'author__username',
+    'created': 'created',
+}, key='created')
@@ -0,0 +1,148 @@
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+            description='Тестовое описание')
+        cls.posts = [
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Пост номер {number}')
+            for number in range(3)
+        ]
+        Comment.objects.create(post=cls.posts[0], author=cls.reader,
+                               text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_post_fields(self):
+        """Все поля поста по умолчанию, связи — по slug и username."""
+        response = self.client.get(
+            reverse('api:post_detail', args=[self.posts[0].pk]))
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['author'], 'author')
+        self.assertEqual(data['group'], 'test-slug')
+        self.assertEqual(data['text'], 'Пост номер 0')
+        self.assertIsNone(data['image'])
+
+    def test_sparse_fieldset_selects_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('api:post_list'), {'fields': 'id,author'})
+        self.assertEqual(response.json()['results'][0],
+                         {'id': self.posts[2].pk, 'author': 'author'})
+        select = queries.captured_queries[-1]['sql']
+        self.assertNotIn('"text"', select)
+        self.assertNotIn('"image"', select)
+
+    def test_unknown_field(self):
+        response = self.client.get(reverse('api:post_list'),
+                                   {'fields': 'id,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('password', response.json()['detail'])
+
+    @override_settings(API_PAGE_SIZE=2)
+    def test_cursor_pagination(self):
+        first = self.client.get(reverse('api:post_list'),
+                                {'group': 'test-slug', 'fields': 'id'})
+        data = first.json()
+        self.assertEqual([item['id'] for item in data['results']],
+                         [self.posts[2].pk, self.posts[1].pk])
+        second = self.client.get(data['next']).json()
+        self.assertEqual(second['results'], [{'id': self.posts[0].pk}])
+        self.assertIsNone(second['next'])
+
+    def test_unchanged_list_not_modified(self):
+        url = reverse('api:comment_list', args=[self.posts[0].pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()['results'][0]['author'], 'reader')
+        repeat = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, 304)
+        Comment.objects.create(post=self.posts[0], author=self.author,
+                               text='Ответ')
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(len(changed.json()['results']), 2)
+
+    def test_post_list_has_no_comment_count(self):
+        """Счётчик комментариев не входит в список: его ETag не меняется."""
+        url = reverse('api:post_list')
+        self.assertNotIn('comments_count', self.client.get(url).json()[
+            'results'][0])
+        response = self.client.get(url, {'fields': 'comments_count'})
+        self.assertEqual(response.status_code, 400)
+        detail = self.client.get(
+            reverse('api:post_detail', args=[self.posts[0].pk]))
+        self.assertEqual(detail.json()['comments_count'], 1)
+
+    def test_groups(self):
+        response = self.client.get(reverse('api:group_detail',
+                                           args=['test-slug']))
+        self.assertEqual(response.json()['title'], 'Тестовая группа')
+        missing = self.client.get(reverse('api:group_detail',
+                                          args=['missing']))
+        self.assertEqual(missing.status_code, 404)
+
+    def test_follows_of_current_user(self):
+        url = reverse('api:follow_list')
+        self.assertEqual(self.client.get(url).status_code, 401)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.client.force_login(self.reader)
+        response = self.client.get(url, {'fields': 'author'})
+        self.assertEqual(response.json()['results'], [{'author': 'author'}])
+        self.assertIn('private', response['Cache-Control'])
+
+    def test_batch(self):
+        """Посты в порядке ids одним запросом, потом — из кэша."""
+        ids = [self.posts[1].pk, 0, self.posts[0].pk]
+        url = reverse('api:post_batch')
+        query = {'ids': ','.join(map(str, ids)), 'fields': 'id,group'}
+        with self.assertNumQueries(1):
+            data = self.client.get(url, query).json()
+        self.assertEqual(data['results'], [
+            {'id': self.posts[1].pk, 'group': 'test-slug'},
+            {'id': self.posts[0].pk, 'group': 'test-slug'}])
+        self.assertEqual(data['missing'], [0])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, query).json(), data)
+
+    def test_batch_sees_changes(self):
+        url = reverse('api:post_batch')
+        query = {'ids': str(self.posts[0].pk), 'fields': 'text,group'}
+        self.client.get(url, query)
+        self.group.slug = 'renamed'
+        self.group.save()
+        post = Post.objects.get(pk=self.posts[0].pk)
+        post.text = 'Исправленный пост'
+        post.save()
+        self.assertEqual(self.client.get(url, query).json()['results'],
+                         [{'text': 'Исправленный пост', 'group': 'renamed'}])
+
+    @override_settings(API_BATCH_SIZE=2)
+    def test_batch_limit(self):
+        response = self.client.get(reverse('api:post_batch'),
+                                   {'ids': '1,2,3'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_benchmark(self):
+        out = io.StringIO()
+        call_command('benchmark_api', repeat=1, stdout=out)
+        self.assertIn('пост: HTML', out.getvalue())
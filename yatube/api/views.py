@@ -0,0 +1,221 @@
+"""Версия 1 API только для чтения.
+
+Списки отдаются окнами по курсору (?cursor=, ссылка next) без OFFSET
+и COUNT(*). ETag строится из версий областей кэша, как у страниц,
+поэтому повторный запрос без изменений получает 304 без обращения к
+постам.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import JsonResponse
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import quote_etag
+from django.views.decorators.http import require_safe
+
+from core.paginator import CursorPaginator
+from posts.models import Comment, Follow, Group, Post, User
+from posts.versions import scope, version_map, versions
+
+from .resources import COMMENTS, FOLLOWS, GROUPS, POST_LIST, POSTS
+
+COMPACT = {'separators': (',', ':'), 'ensure_ascii': False}
+
+
+def error(status, detail):
+    return JsonResponse({'detail': detail}, status=status,
+                        json_dumps_params=COMPACT)
+
+
+def page_size(request):
+    try:
+        size = int(request.GET.get('limit', settings.API_PAGE_SIZE))
+    except ValueError:
+        raise ValueError('limit должен быть числом.')
+    return max(1, min(size, settings.API_MAX_PAGE_SIZE))
+
+
+def api_response(request, scopes, build, private=False):
+    """JSON из build() с ETag по версиям областей scopes."""
+    parts = [request.get_full_path(), versions(*scopes)]
+    if private:
+        parts.append(str(request.user.pk))
+    etag = quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        try:
+            data = build()
+        except ValueError as problem:
+            return error(400, str(problem))
+        response = JsonResponse(data, json_dumps_params=COMPACT)
+    response['ETag'] = etag
+    patch_cache_control(response, no_cache=True,
+                        **({'private': True} if private else {}))
+    if private:
+        patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def window(request, resource, queryset):
+    """Окно записей после ?cursor= со ссылкой на следующее."""
+    names = resource.select(request.GET.get('fields'))
+    paginator = CursorPaginator(resource.values(queryset, names),
+                                page_size(request), key=resource.key)
+    rows, token = paginator.next_window(request.GET.get('cursor'))
+    next_url = None
+    if token:
+        query = request.GET.copy()
+        query['cursor'] = token
+        next_url = request.build_absolute_uri(
+            f'{request.path}?{query.urlencode()}')
+    return {
+        'results': [resource.serialize(row, names) for row in rows],
+        'next': next_url,
+    }
+
+
+def detail(request, resource, queryset):
+    names = resource.select(request.GET.get('fields'))
+    return resource.serialize(resource.values(queryset, names)[0], names)
+
+
+@require_safe
+def post_list(request):
+    posts = Post.objects.all()
+    scopes = []
+    # Фильтры совпадают с лентами группы и автора, и версии берутся их.
+    slug = request.GET.get('group')
+    if slug:
+        group = Group.objects.filter(slug=slug).values_list('pk', flat=True)
+        if not group:
+            return error(404, 'Группа не найдена.')
+        posts = posts.filter(group_id=group[0])
+        scopes.append(scope('group', group[0]))
+    username = request.GET.get('author')
+    if username:
+        author = User.objects.filter(
+            username=username).values_list('pk', flat=True)
+        if not author:
+            return error(404, 'Автор не найден.')
+        posts = posts.filter(author_id=author[0])
+        scopes.append(scope('author', author[0]))
+    return api_response(request, scopes or [scope('index')],
+                        lambda: window(request, POST_LIST, posts))
+
+
+@require_safe
+def post_detail(request, post_id):
+    found = Post.objects.filter(pk=post_id).values_list('group_id')
+    if not found:
+        return error(404, 'Пост не найден.')
+    scopes = [scope('post', post_id)]
+    # Slug группы в посте меняется вместе с версией группы.
+    if found[0][0]:
+        scopes.append(scope('group', found[0][0]))
+    return api_response(request, scopes, lambda: detail(
+        request, POSTS, Post.objects.filter(pk=post_id)))
+
+
+def parse_ids(raw):
+    try:
+        ids = list(dict.fromkeys(int(pk) for pk in raw.split(',') if pk))
+    except ValueError:
+        raise ValueError('ids — номера постов через запятую.')
+    if len(ids) > settings.API_BATCH_SIZE:
+        raise ValueError(
+            f'Не больше {settings.API_BATCH_SIZE} постов за запрос.')
+    return ids
+
+
+def post_rows(ids):
+    """Строки постов по id, None — поста нет.
+
+    Строки берутся из кэша одним get_many, а недостающие — одним
+    запросом in_bulk вместе с авторами и группами. Ключ записи включает
+    версию поста, а slug группы сверяется с её версией, поэтому правки
+    не нужно искать в кэше и удалять.
+    """
+    post_versions = version_map(*(scope('post', pk) for pk in ids))
+    keys = {f'api-post:{pk}:{post_versions[scope("post", pk)]}': pk
+            for pk in ids}
+    cached = cache.get_many(keys)
+    group_versions = version_map(*{
+        group for group, _, _ in cached.values() if group})
+    rows = {
+        keys[key]: row for key, (group, version, row) in cached.items()
+        if not group or group_versions[group] == version}
+    # Отсутствующий пост тоже кэшируется: создание поста меняет версию.
+    missing = [pk for pk in ids if pk not in rows]
+    if missing:
+        posts = POSTS.objects(Post.objects.all()).in_bulk(missing)
+        group_versions.update(version_map(*{
+            scope('group', post.group_id)
+            for post in posts.values() if post.group_id}))
+        fresh = {}
+        for key, pk in keys.items():
+            if pk in rows:
+                continue
+            post = posts.get(pk)
+            if post is None:
+                rows[pk] = None
+                fresh[key] = (None, None, None)
+                continue
+            rows[pk] = POSTS.row(post)
+            group = post.group_id and scope('group', post.group_id)
+            fresh[key] = (group, group_versions.get(group), rows[pk])
+        cache.set_many(fresh, settings.FRAGMENT_CACHE_TIMEOUT)
+    return rows
+
+
+@require_safe
+def post_batch(request):
+    """Посты по списку ?ids= одним ответом, в порядке ids."""
+    try:
+        ids = parse_ids(request.GET.get('ids', ''))
+        names = POSTS.select(request.GET.get('fields'))
+    except ValueError as problem:
+        return error(400, str(problem))
+    rows = post_rows(ids) if ids else {}
+    return JsonResponse({
+        'results': [POSTS.serialize(rows[pk], names)
+                    for pk in ids if rows[pk] is not None],
+        'missing': [pk for pk in ids if rows[pk] is None],
+    }, json_dumps_params=COMPACT)
+
+
+@require_safe
+def comment_list(request, post_id):
+    if not Post.objects.filter(pk=post_id).exists():
+        return error(404, 'Пост не найден.')
+    return api_response(request, [scope('post', post_id)], lambda: window(
+        request, COMMENTS, Comment.objects.filter(post_id=post_id)))
+
+
+@require_safe
+def group_list(request):
+    # Создание и правка группы меняют версию общей ленты.
+    return api_response(request, [scope('index')], lambda: window(
+        request, GROUPS, Group.objects.all()))
+
+
+@require_safe
+def group_detail(request, slug):
+    found = Group.objects.filter(slug=slug).values_list('pk', flat=True)
+    if not found:
+        return error(404, 'Группа не найдена.')
+    return api_response(request, [scope('group', found[0])], lambda: detail(
+        request, GROUPS, Group.objects.filter(pk=found[0])))
+
+
+@require_safe
+def follow_list(request):
+    """Подписки текущего пользователя."""
+    if not request.user.is_authenticated:
+        return error(401, 'Нужно войти.')
+    return api_response(
+        request, [scope('feed', request.user.pk)],
+        lambda: window(request, FOLLOWS,
+                       Follow.objects.filter(user=request.user)),
+        private=True)
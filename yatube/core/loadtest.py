@@ -0,0 +1,367 @@
+"""Нагрузочный прогон WSGI-приложения внутри процесса.
+
+Виртуальные пользователи вызывают yatube.wsgi.application напрямую,
+без сети и сервера, из пула потоков или процессов. Каждый сценарий —
+цепочка запросов одного посетителя; по каждому запросу записываются
+представление, статус, время, число SQL-запросов и попадания в кэш.
+"""
+import io
+import multiprocessing
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from http.cookies import SimpleCookie
+from importlib import import_module
+from urllib.parse import urlencode, urlsplit
+
+from django.conf import settings
+from django.contrib.auth import (BACKEND_SESSION_KEY, HASH_SESSION_KEY,
+                                 SESSION_KEY)
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.http import HttpRequest
+from django.middleware.csrf import get_token
+from django.urls import Resolver404, resolve, reverse
+
+# Адрес не из INTERNAL_IPS: панель отладки не встраивается в ответы.
+REMOTE_ADDR = '192.0.2.1'
+
+Sample = namedtuple('Sample', 'view status seconds queries hits misses')
+
+_MISSING = object()
+_local = threading.local()
+
+
+def _count(hits, misses):
+    if getattr(_local, 'depth', 0) == 0:
+        _local.hits = getattr(_local, 'hits', 0) + hits
+        _local.misses = getattr(_local, 'misses', 0) + misses
+
+
+def take_cache_counts():
+    """Попадания и промахи кэша в текущем потоке с прошлого вызова."""
+    counts = getattr(_local, 'hits', 0), getattr(_local, 'misses', 0)
+    _local.hits = _local.misses = 0
+    return counts
+
+
+class count_cache:
+    """Подменяет get и get_many бэкенда кэша на считающие попадания.
+
+    Бэкенд у каждого потока свой, поэтому меняются методы класса.
+    """
+
+    def __init__(self, alias='default'):
+        self.backend_class = type(caches[alias])
+
+    def __enter__(self):
+        backend_class = self.backend_class
+        self.original = backend_class.get, backend_class.get_many
+        original_get, original_get_many = self.original
+
+        def get(backend, key, default=None, version=None):
+            value = original_get(backend, key, _MISSING, version)
+            _count(value is not _MISSING, value is _MISSING)
+            return default if value is _MISSING else value
+
+        def get_many(backend, keys, version=None):
+            keys = list(keys)
+            # BaseCache.get_many зовёт get по ключу: не считаем дважды.
+            _local.depth = getattr(_local, 'depth', 0) + 1
+            try:
+                found = original_get_many(backend, keys, version)
+            finally:
+                _local.depth -= 1
+            _count(len(found), len(keys) - len(found))
+            return found
+
+        backend_class.get, backend_class.get_many = get, get_many
+        return self
+
+    def __exit__(self, *exc_info):
+        self.backend_class.get, self.backend_class.get_many = self.original
+        return False
+
+
+def login_cookies(user):
+    """Cookie сессии вошедшего пользователя, как у Client.force_login."""
+    engine = import_module(settings.SESSION_ENGINE)
+    session = engine.SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return {settings.SESSION_COOKIE_NAME: session.session_key}
+
+
+class Visitor:
+    """Посетитель с cookie; POST-запросы несут токен CSRF."""
+
+    def __init__(self, cookies=None):
+        request = HttpRequest()
+        self.csrf_token = get_token(request)
+        self.cookies = {settings.CSRF_COOKIE_NAME:
+                        request.META['CSRF_COOKIE'], **(cookies or {})}
+
+    def environ(self, method, url, form=None):
+        parts = urlsplit(url)
+        body = b''
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': parts.path,
+            'QUERY_STRING': parts.query,
+            'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost',
+            'REMOTE_ADDR': REMOTE_ADDR,
+            'HTTP_COOKIE': '; '.join(
+                f'{name}={value}' for name, value in self.cookies.items()),
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        if method == 'POST':
+            body = urlencode({'csrfmiddlewaretoken': self.csrf_token,
+                              **(form or {})}).encode()
+            environ['CONTENT_TYPE'] = 'application/x-www-form-urlencoded'
+        environ['CONTENT_LENGTH'] = str(len(body))
+        environ['wsgi.input'] = io.BytesIO(body)
+        return environ
+
+    def request(self, application, method, url, form=None):
+        """Статус ответа; тело дочитывается, cookie запоминаются."""
+        started = []
+
+        def start_response(status, headers, exc_info=None):
+            started.append(status)
+            for name, value in headers:
+                if name.lower() == 'set-cookie':
+                    for morsel in SimpleCookie(value).values():
+                        self.cookies[morsel.key] = morsel.value
+
+        result = application(self.environ(method, url, form), start_response)
+        try:
+            for _ in result:
+                pass
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return int(started[0].split()[0])
+
+
+def view_name(url):
+    try:
+        match = resolve(urlsplit(url).path)
+    except Resolver404:
+        return 'not_found'
+    return match.view_name
+
+
+# Сценарии: цепочки (метод, адрес, форма) одного посетителя. data —
+# образцы из базы: id постов и групп, slug, имена, слова для поиска.
+
+def anonymous_browsing(data, rng):
+    post_id = rng.choice(data['posts'])
+    return [
+        ('GET', reverse('posts:index'), None),
+        ('GET', f'{reverse("posts:index")}?page={rng.randint(2, 5)}', None),
+        ('GET', reverse('posts:group_list', args=[rng.choice(data['slugs'])]),
+         None),
+        ('GET', reverse('posts:profile', args=[rng.choice(data['authors'])]),
+         None),
+        ('GET', reverse('posts:post_detail', args=[post_id]), None),
+        ('GET', f'{reverse("posts:search")}?'
+                f'{urlencode({"q": rng.choice(data["words"])})}', None),
+        ('GET', rng.choice([reverse('about:author'), reverse('about:tech'),
+                            reverse('users:login'),
+                            reverse('users:signup')]), None),
+    ]
+
+
+def feed_reading(data, rng):
+    return [
+        ('GET', reverse('posts:follow_index'), None),
+        ('GET', f'{reverse("posts:follow_index")}?page=2', None),
+        ('GET', reverse('posts:post_detail', args=[rng.choice(data['posts'])]),
+         None),
+        ('GET', reverse('posts:index'), None),
+    ]
+
+
+def posting(data, rng):
+    return [
+        ('GET', reverse('posts:post_create'), None),
+        ('POST', reverse('posts:post_create'), {
+            'text': ' '.join(rng.choices(data['words'], k=20)),
+            'group': rng.choice(data['groups'] + ['']),
+        }),
+    ]
+
+
+def commenting(data, rng):
+    post_id = rng.choice(data['posts'])
+    url = reverse('posts:post_detail', args=[post_id])
+    return [
+        ('GET', url, None),
+        ('POST', reverse('posts:add_comment', args=[post_id]), {
+            'text': ' '.join(rng.choices(data['words'], k=8))}),
+        ('GET', url, None),
+    ]
+
+
+def following(data, rng):
+    author = rng.choice(data['authors'])
+    action = rng.choice(['posts:profile_follow', 'posts:profile_unfollow'])
+    return [
+        ('GET', reverse('posts:profile', args=[author]), None),
+        ('GET', reverse(action, args=[author]), None),
+        ('GET', reverse('posts:follow_index'), None),
+    ]
+
+
+SCENARIOS = {
+    'anonymous': anonymous_browsing,
+    'reader': feed_reading,
+    'poster': posting,
+    'commenter': commenting,
+    'follower': following,
+}
+ANONYMOUS = {'anonymous'}
+
+
+def make_plan(mix, seed=0, requests=1000, duration=None, logins=20,
+              sample_size=1000):
+    """Параметры прогона и образцы из базы; передаётся и в процессы."""
+    from posts.models import Follow, Group, Post, User
+    posts = list(Post.objects.order_by('-pub_date').values_list(
+        'pk', 'author__username', 'text')[:sample_size])
+    groups = list(Group.objects.values_list('pk', 'slug')[:sample_size])
+    if not posts or not groups:
+        raise ValueError('Нужны посты и группы.')
+    # Читатели ленты — пользователи с подписками, если такие есть.
+    readers = User.objects.filter(
+        pk__in=Follow.objects.values('user')[:logins])
+    users = list(readers) or list(User.objects.order_by('pk')[:logins])
+    return {
+        'mix': mix,
+        'seed': seed,
+        'requests': requests,
+        'deadline': time.time() + duration if duration else float('inf'),
+        'logins': [login_cookies(user) for user in users],
+        'data': {
+            'posts': [pk for pk, _, _ in posts],
+            'authors': sorted({author for _, author, _ in posts}),
+            'words': sorted({word for _, _, text in posts[:200]
+                             for word in text.split()}),
+            'groups': [str(pk) for pk, _ in groups],
+            'slugs': [slug for _, slug in groups],
+        },
+    }
+
+
+def run_worker(index, plan):
+    """Прогон одного исполнителя; возвращает список Sample."""
+    from yatube.wsgi import application
+    rng = random.Random(plan['seed'] * 1000 + index)
+    names, weights = zip(*plan['mix'].items())
+    connection = connections[DEFAULT_DB_ALIAS]
+    debug_cursor = connection.force_debug_cursor
+    connection.force_debug_cursor = True
+    samples = []
+    deadline = plan['deadline']
+    try:
+        while len(samples) < plan['requests'] and time.time() < deadline:
+            name = rng.choices(names, weights)[0]
+            visitor = Visitor(
+                None if name in ANONYMOUS else rng.choice(plan['logins']))
+            for method, url, form in SCENARIOS[name](plan['data'], rng):
+                connection.queries_log.clear()
+                take_cache_counts()
+                started = time.perf_counter()
+                status = visitor.request(application, method, url, form)
+                seconds = time.perf_counter() - started
+                samples.append(Sample(
+                    view_name(url), status, seconds,
+                    len(connection.queries_log), *take_cache_counts()))
+    finally:
+        connection.force_debug_cursor = debug_cursor
+    return samples
+
+
+def _run_thread(index, plan):
+    try:
+        return run_worker(index, plan)
+    finally:
+        connections.close_all()
+
+
+def run(plan, workers, processes=False):
+    """Samples всех исполнителей и время прогона в секундах."""
+    started = time.perf_counter()
+    if workers == 1:
+        with count_cache():
+            samples = run_worker(0, plan)
+        return samples, time.perf_counter() - started
+    if processes:
+        # spawn, как у пула приёма картинок: fork копирует блокировки.
+        executor = ProcessPoolExecutor(
+            workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_start_process_counting)
+    else:
+        executor = ThreadPoolExecutor(workers)
+    worker = run_worker if processes else _run_thread
+    with count_cache(), executor:
+        results = list(executor.map(worker, range(workers),
+                                    [plan] * workers))
+    return ([sample for samples in results for sample in samples],
+            time.perf_counter() - started)
+
+
+def _start_process_counting():
+    import django
+    django.setup()
+    count_cache().__enter__()
+
+
+def report(samples, elapsed):
+    """Строки отчёта по представлениям: от самых частых."""
+    by_view = defaultdict(list)
+    for sample in samples:
+        by_view[sample.view].append(sample)
+    rows = []
+    for view, group in sorted(by_view.items(),
+                              key=lambda item: -len(item[1])):
+        rows.append(summary(view, group, elapsed))
+    rows.append(summary('всего', samples, elapsed))
+    return rows
+
+
+def summary(view, samples, elapsed):
+    timings = sorted(sample.seconds * 1000 for sample in samples)
+    if len(timings) > 1:
+        cuts = statistics.quantiles(timings, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = timings[0]
+    hits = sum(sample.hits for sample in samples)
+    lookups = hits + sum(sample.misses for sample in samples)
+    return {
+        'view': view,
+        'requests': len(samples),
+        'rps': len(samples) / elapsed,
+        'p50': p50,
+        'p95': p95,
+        'p99': p99,
+        'queries': statistics.mean(sample.queries for sample in samples),
+        'hit_rate': hits / lookups if lookups else None,
+        'errors': sum(sample.status >= 500 for sample in samples),
+    }
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.loadtest import SCENARIOS, make_plan, report, run
+
+DEFAULT_MIX = 'anonymous=70,reader=15,poster=5,commenter=5,follower=5'
+
+
+class Command(BaseCommand):
+    help = ('Нагружает yatube.wsgi.application из пула потоков или '
+            'процессов по смеси сценариев и печатает по каждому '
+            'представлению запросы в секунду, p50/p95/p99, число '
+            'SQL-запросов и долю попаданий в кэш. Сценарии пишут в базу: '
+            'запускайте на копии, например из generate_dataset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--processes', action='store_true',
+                            help='Процессы вместо потоков.')
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Запросов на исполнителя, не больше.')
+        parser.add_argument('--duration', type=float, default=30,
+                            help='Длительность прогона, секунды; 0 — '
+                                 'без ограничения.')
+        parser.add_argument(
+            '--mix', default=DEFAULT_MIX,
+            help='Веса сценариев: ' + ', '.join(SCENARIOS) + '.')
+        parser.add_argument('--logins', type=int, default=20,
+                            help='Сколько пользователей входит на сайт.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options['mix'])
+        try:
+            plan = make_plan(mix, options['seed'], options['requests'],
+                             options['duration'], options['logins'])
+        except ValueError as error:
+            raise CommandError(f'{error} Заполните базу generate_dataset.')
+        samples, elapsed = run(plan, options['workers'],
+                               options['processes'])
+        self.stdout.write(
+            f'{"представление":<34}{"запросов":>9}{"в сек":>8}'
+            f'{"p50":>8}{"p95":>8}{"p99":>8}{"SQL":>6}{"кэш":>6}'
+            f'{"ошибок":>7}')
+        for row in report(samples, elapsed):
+            hit_rate = ('—' if row['hit_rate'] is None
+                        else f'{row["hit_rate"]:.0%}')
+            self.stdout.write(
+                f'{row["view"]:<34}{row["requests"]:>9}{row["rps"]:>8.1f}'
+                f'{row["p50"]:>8.1f}{row["p95"]:>8.1f}{row["p99"]:>8.1f}'
+                f'{row["queries"]:>6.1f}{hit_rate:>6}{row["errors"]:>7}')
+        self.stdout.write(f'Время мс; прогон {elapsed:.1f} с')
+
+    @staticmethod
+    def parse_mix(raw):
+        mix = {}
+        for part in raw.split(','):
+            name, _, weight = part.partition('=')
+            name = name.strip()
+            if name not in SCENARIOS:
+                raise CommandError(f'Неизвестный сценарий {name!r}.')
+            try:
+                mix[name] = float(weight or 1)
+            except ValueError:
+                raise CommandError(f'Вес сценария {name}: {weight!r}.')
+        return mix
@@ -0,0 +1,253 @@
+import base64
+import binascii
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, value, pk):
+    """Упаковывает позицию (значение ключа, pk) в непрозрачный токен."""
+    if hasattr(value, 'isoformat'):
+        value = value.isoformat()
+    raw = f'{direction}|{value}|{pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, parse_value=parse_datetime):
+    """Распаковывает токен; для битого токена возвращает None."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        direction, value, pk = raw.split('|')
+        value = parse_value(value)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or value is None:
+        return None
+    return direction, value, pk
+
+
+def estimate_count(queryset, above):
+    """Число строк таблицы без COUNT(*), если их больше above.
+
+    Оценка берётся из статистики СУБД; для небольшой таблицы тем же
+    запросом считается точное число. Возвращает (число, оценено ли
+    оно) или None, если СУБД оценку не даёт.
+    """
+    connection = connections[queryset.db]
+    meta = queryset.model._meta
+    table = connection.ops.quote_name(meta.db_table)
+    pk = connection.ops.quote_name(meta.pk.column)
+    exact = f'(SELECT COUNT(*) FROM {table})'
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute(
+                f'SELECT CASE WHEN reltuples > %s THEN reltuples::bigint '
+                f'ELSE {exact} END, reltuples > %s '
+                f'FROM pg_class WHERE relname = %s',
+                [above, above, meta.db_table])
+        elif connection.vendor == 'sqlite':
+            # Наибольший rowid читается с края B-дерева за O(log n) и
+            # при редких удалениях близок к числу строк.
+            cursor.execute(
+                f'SELECT CASE WHEN last > %s THEN last ELSE {exact} END, '
+                f'last > %s FROM (SELECT MAX({pk}) AS last FROM {table})',
+                [above, above])
+        else:
+            return None
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    return int(row[0]), bool(row[1])
+
+
+class CursorPaginator(Paginator):
+    """Паджинатор с переходом по курсору (keyset pagination).
+
+    Страницы по номеру (?page=) работают как у обычного Paginator,
+    а страницы по курсору (?cursor=) выбираются условием
+    `(key, pk) < (значение, pk)` без OFFSET и COUNT(*), поэтому
+    время ответа не зависит от глубины страницы.
+    """
+    count_is_estimated = False
+
+    def __init__(self, object_list, per_page, key='pub_date', count=None,
+                 **kwargs):
+        self.key = key
+        object_list = object_list.order_by(f'-{key}', '-pk')
+        super().__init__(object_list, per_page, **kwargs)
+        if count is not None:
+            # Известное заранее число записей избавляет от COUNT(*).
+            self.count = count
+
+    def get_page(self, number):
+        page = super().get_page(number)
+        if (page.number > 1 and self.count_is_estimated
+                and not page.object_list):
+            # Оценённое число страниц может оказаться больше настоящего:
+            # тогда отдаём последнюю страницу, прочитанную с конца.
+            return self._cursor_page(PREVIOUS, None, None)
+        page.is_cursor = False
+        page.previous_cursor, page.next_cursor = self._page_cursors(page)
+        page.page_window = self.page_window(page.number)
+        return page
+
+    def page_window(self, number, on_each_side=2, on_ends=1):
+        """Номера страниц вокруг текущей и по краям; None — пропуск."""
+        num_pages = self.num_pages
+        shown = sorted({
+            *range(1, min(on_ends, num_pages) + 1),
+            *range(max(number - on_each_side, 1),
+                   min(number + on_each_side, num_pages) + 1),
+            *range(max(num_pages - on_ends + 1, 1), num_pages + 1),
+        })
+        window = []
+        for page_number in shown:
+            if window and page_number - window[-1] > 1:
+                window.append(None)
+            window.append(page_number)
+        return window
+
+    def get_cursor_page(self, token):
+        """Возвращает страницу, соседнюю с позицией из токена."""
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            return self.get_page(1)
+        return self._cursor_page(*cursor)
+
+    def window(self, queryset, direction, value, pk, pk_field='pk'):
+        """Сужает queryset до записей по нужную сторону от позиции."""
+        if value is None:
+            return queryset if direction == NEXT else queryset.reverse()
+        # Условие (key <= value) вынесено отдельно, чтобы СУБД начала
+        # чтение индекса (…, key, pk) прямо с позиции курсора.
+        if direction == NEXT:
+            return queryset.filter(
+                Q(**{f'{self.key}__lte': value}),
+                Q(**{f'{self.key}__lt': value}) | Q(**{f'{pk_field}__lt': pk}),
+            )
+        return queryset.filter(
+            Q(**{f'{self.key}__gte': value}),
+            Q(**{f'{self.key}__gt': value}) | Q(**{f'{pk_field}__gt': pk}),
+        ).reverse()
+
+    def next_window(self, token):
+        """Записи после позиции из токена и токен следующего окна.
+
+        Только вперёд и без номеров страниц — для лент и API. Записи
+        могут быть и словарями values(), если в них есть key и pk.
+        """
+        cursor = decode_cursor(token) if token else None
+        if cursor is None or cursor[0] != NEXT:
+            cursor = (NEXT, None, None)
+        items = self._fetch(*cursor, self.per_page + 1)
+        next_token = None
+        if len(items) > self.per_page:
+            items = items[:self.per_page]
+            next_token = encode_cursor(NEXT, *self._position(items[-1]))
+        return items, next_token
+
+    def _position(self, item):
+        if isinstance(item, dict):
+            return item[self.key], item['pk']
+        return getattr(item, self.key), item.pk
+
+    def _fetch(self, direction, value, pk, limit):
+        """Записи за позицией в порядке удаления от неё."""
+        window = self.window(self.object_list, direction, value, pk)
+        return list(window[:limit])
+
+    def _cursor_page(self, direction, value, pk):
+        items = self._fetch(direction, value, pk, self.per_page + 1)
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if direction == PREVIOUS:
+            items.reverse()
+            has_previous, has_next = has_more, value is not None
+        else:
+            has_previous, has_next = value is not None, has_more
+        if not items and value is not None:
+            return self.get_page(1)
+        # Позиция страницы относительна: известны только соседи,
+        # поэтому номер и число страниц задаются без COUNT(*).
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        page = self._get_page(items, number, self)
+        page.is_cursor = True
+        page.previous_cursor, page.next_cursor = self._cursors(
+            items, has_previous, has_next)
+        return page
+
+    def _page_cursors(self, page):
+        """Курсоры страницы по номеру; читают её записи."""
+        return self._cursors(page.object_list, page.has_previous(),
+                             page.has_next())
+
+    def _cursors(self, items, has_previous, has_next):
+        previous_cursor = next_cursor = None
+        if not len(items):
+            return previous_cursor, next_cursor
+        if has_previous:
+            previous_cursor = encode_cursor(PREVIOUS,
+                                            *self._position(items[0]))
+        if has_next:
+            next_cursor = encode_cursor(
+                NEXT, *self._position(items[len(items) - 1]))
+        return previous_cursor, next_cursor
+
+
+class CachedCountPaginator(CursorPaginator):
+    """Паджинатор, который не считает COUNT(*) на каждый запрос.
+
+    Число записей хранится в кэше под ключом count_key (в него стоит
+    включать версию данных, чтобы запись сбрасывала счётчик). Для
+    таблицы целиком свыше estimate_above записей берётся оценка из
+    статистики СУБД. Под тем же ключом кэшируются и курсоры страниц
+    по номеру: страница, чей фрагмент взят из кэша, не выбирает записи.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None,
+                 estimate_above=None, count_timeout=None, **kwargs):
+        self.count_key = count_key
+        self.estimate_above = estimate_above
+        self.count_timeout = count_timeout
+        self.count_is_estimated = False
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        key = f'paginator-count:{self.count_key}'
+        if self.count_key is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                self.count_is_estimated = cached[1]
+                return cached[0]
+        counted = None
+        whole_table = not self.object_list.query.where
+        if self.estimate_above is not None and whole_table:
+            counted = estimate_count(self.object_list, self.estimate_above)
+        if counted is None:
+            counted = self.object_list.count(), False
+        count, self.count_is_estimated = counted
+        if self.count_key is not None:
+            cache.set(key, (count, self.count_is_estimated),
+                      self.count_timeout)
+        return count
+
+    def _page_cursors(self, page):
+        if self.count_key is None:
+            return super()._page_cursors(page)
+        key = f'paginator-cursors:{self.count_key}:{page.number}'
+        cursors = cache.get(key)
+        if cursors is None:
+            cursors = super()._page_cursors(page)
+            cache.set(key, cursors, self.count_timeout)
+        return cursors
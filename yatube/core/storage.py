@@ -0,0 +1,129 @@
+import hashlib
+import os
+import time
+
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from PIL import Image
+
+
+def walk_files(storage, directory):
+    """Файлы каталога хранилища вглубь: пары (имя, os.stat_result).
+
+    Каталоги читаются через os.scandir по одному, поэтому весь список
+    файлов в памяти не держится.
+    """
+    root = storage.path(directory)
+    if not os.path.isdir(root):
+        return
+    pending = [root]
+    while pending:
+        with os.scandir(pending.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    name = os.path.relpath(entry.path, storage.location)
+                    yield name.replace(os.sep, '/'), entry.stat()
+
+
+# Точность времени последнего обращения к файлу, секунды
+ACCESS_BUCKET = 60 * 60
+
+
+def _access_key(name):
+    return f'media-accessed:{name}'
+
+
+def touch_media(files):
+    """Запоминает в кэше час обращения к файлам MEDIA_ROOT.
+
+    files — {имя: исходная картинка или None}; источник миниатюры
+    запоминается, чтобы при её удалении сбросить страницы поста.
+    Запись обновляется не чаще раза в ACCESS_BUCKET секунд.
+    """
+    hour = int(time.time()) // ACCESS_BUCKET
+    keys = {_access_key(name): name for name in files}
+    recorded = cache.get_many(keys)
+    changed = {}
+    for key, name in keys.items():
+        last_hour, source = recorded.get(key, (None, None))
+        if last_hour != hour or files[name] not in (None, source):
+            changed[key] = (hour, files[name] or source)
+    if changed:
+        cache.set_many(changed, timeout=None)
+
+
+def media_accessed(names):
+    """Записанные обращения {имя: (время, исходная картинка)}.
+
+    Время округлено вверх до ACCESS_BUCKET, чтобы не счесть файл
+    старше, чем он есть.
+    """
+    keys = {_access_key(name): name for name in names}
+    return {keys[key]: ((hour + 1) * ACCESS_BUCKET, source)
+            for key, (hour, source) in cache.get_many(keys).items()}
+
+
+def forget_media_access(names):
+    cache.delete_many([_access_key(name) for name in names])
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранилище, которое называет файлы по SHA-256 содержимого.
+
+    Файл сохраняется в каталог из upload_to под именем <хеш><расширение>,
+    поэтому одинаковые загрузки получают одно имя и лежат на диске
+    один раз. Удалять такой файл можно, только когда на него не
+    осталось ссылок.
+
+    Первые shard_levels пар символов хеша задают вложенные каталоги
+    (posts/ab/cd/abcd….jpg), чтобы в одном каталоге не копились
+    миллионы файлов.
+    """
+
+    def __init__(self, shard_levels=2, **kwargs):
+        self.shard_levels = shard_levels
+        super().__init__(**kwargs)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        if self.exists(name):
+            return name
+        return super().save(name, content, max_length)
+
+    def content_name(self, name, content):
+        """Имя по хешу содержимого; файл читается порциями."""
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        directory, filename = os.path.split(name)
+        extension = os.path.splitext(filename)[1].lower()
+        return self.sharded_name(directory, digest.hexdigest() + extension)
+
+    def sharded_name(self, directory, filename):
+        shards = [filename[2 * level:2 * level + 2]
+                  for level in range(self.shard_levels)]
+        return os.path.join(directory, *shards, filename)
+
+    def is_sharded(self, name):
+        """Лежит ли файл уже в своём каталоге по хешу."""
+        directory, filename = os.path.split(name)
+        for level in reversed(range(self.shard_levels)):
+            directory, shard = os.path.split(directory)
+            if shard != filename[2 * level:2 * level + 2]:
+                return False
+        return True
+
+    def image_size(self, name):
+        """Размер картинки по заголовку файла (для sorl-thumbnail)."""
+        with self.open(name) as image_file:
+            return Image.open(image_file).size
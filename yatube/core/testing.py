@@ -0,0 +1,81 @@
+from contextlib import ContextDecorator, contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.runner import DiscoverRunner
+from django.test.utils import CaptureQueriesContext, override_settings
+
+
+class query_budget(ContextDecorator):
+    """Падает, если внутри блока выполнено больше limit SQL-запросов.
+
+    Работает и как контекстный менеджер, и как декоратор тестов:
+    так изменение шаблона, вернувшее N+1, ломает CI, а не прод.
+    """
+
+    def __init__(self, limit, using=DEFAULT_DB_ALIAS):
+        self.limit = limit
+        self.using = using
+
+    def __enter__(self):
+        self.queries = CaptureQueriesContext(connections[self.using])
+        self.queries.__enter__()
+        return self.queries
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.queries.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        executed = len(self.queries)
+        if executed > self.limit:
+            sql = '\n'.join(
+                f'{number}. {query["sql"]}'
+                for number, query in enumerate(self.queries, start=1))
+            raise AssertionError(
+                f'Выполнено {executed} запросов при бюджете {self.limit}:'
+                f'\n{sql}')
+        return False
+
+
+@contextmanager
+def run_on_commit(using=DEFAULT_DB_ALIAS):
+    """Выполняет on_commit-колбэки, отложенные внутри блока.
+
+    TestCase не коммитит транзакцию, и без этого колбэки не вызываются.
+    """
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    yield
+    callbacks = connection.run_on_commit[start:]
+    del connection.run_on_commit[start:]
+    for _, callback in callbacks:
+        callback()
+
+
+def isolated_caches(location):
+    """CACHES с отдельным локальным кэшем для тестов."""
+    return {
+        alias: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': location,
+        }
+        for alias in settings.CACHES
+    }
+
+
+class TestRunner(DiscoverRunner):
+    """Запускает тесты с отдельным локальным кэшем.
+
+    Иначе тесты и запущенный рядом сервер делили бы memcached, и сервер
+    отдавал бы фрагменты, собранные из тестовой базы.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.cache_settings = override_settings(
+            CACHES=isolated_caches('yatube-tests'))
+        self.cache_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.cache_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,4 +1,14 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+
+from core.loadtest import SCENARIOS, make_plan, report, run
+from core.paginator import CachedCountPaginator, CursorPaginator
+from posts.models import Comment, Follow, Group, Post, User
 
 
 class ViewTestClass(TestCase):
@@ -9,3 +19,164 @@ class ViewTestClass(TestCase):
     def test_page_not_found_uses_correct_template(self):
         response = self.client.get('/nonexist-page/')
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class PageWindowTestClass(TestCase):
+    def test_page_window(self):
+        """Окно номеров страниц не растёт вместе с числом страниц."""
+        paginator = CursorPaginator(Group.objects.all(), 1, key='created',
+                                    count=1000)
+        self.assertEqual(paginator.page_window(500),
+                         [1, None, 498, 499, 500, 501, 502, None, 1000])
+        self.assertEqual(paginator.page_window(2),
+                         [1, 2, 3, 4, None, 1000])
+
+    def test_cached_count(self):
+        """Число записей берётся из кэша, пока не сменится ключ."""
+        cache.clear()
+        Group.objects.create(title='Группа', slug='group', description='-')
+        counted = CachedCountPaginator(Group.objects.all(), 10,
+                                       key='created', count_key='v1')
+        self.assertEqual(counted.count, 1)
+        Group.objects.create(title='Группа 2', slug='group-2',
+                             description='-')
+        with self.assertNumQueries(0):
+            cached = CachedCountPaginator(Group.objects.all(), 10,
+                                          key='created', count_key='v1')
+            self.assertEqual(cached.count, 1)
+        fresh = CachedCountPaginator(Group.objects.all(), 10,
+                                     key='created', count_key='v2')
+        self.assertEqual(fresh.count, 2)
+
+    def test_estimated_count(self):
+        """Для большой таблицы берётся оценка, а не COUNT(*)."""
+        for number in range(3):
+            Group.objects.create(title=str(number), slug=f'group-{number}',
+                                 description='-')
+        paginator = CachedCountPaginator(Group.objects.all(), 10,
+                                         key='created', estimate_above=1)
+        self.assertEqual(paginator.count,
+                         Group.objects.order_by('-pk').first().pk)
+        self.assertTrue(paginator.count_is_estimated)
+
+    def test_small_table_counted_in_one_query(self):
+        """Оценка ниже порога не добавляет запрос к COUNT(*)."""
+        for number in range(3):
+            Group.objects.create(title=str(number), slug=f'group-{number}',
+                                 description='-')
+        Group.objects.filter(slug='group-1').delete()
+        paginator = CachedCountPaginator(Group.objects.all(), 10,
+                                         key='created', estimate_above=10)
+        with self.assertNumQueries(1):
+            self.assertEqual(paginator.count, 2)
+        self.assertFalse(paginator.count_is_estimated)
+
+    def test_overestimated_page_falls_back_to_last(self):
+        """Страница за пределами оценки отдаёт последнюю настоящую."""
+        groups = [Group.objects.create(title=str(number),
+                                       slug=f'group-{number}',
+                                       description='-')
+                  for number in range(5)]
+        Group.objects.filter(pk__in=[group.pk for group in groups[1:4]]
+                             ).delete()
+        paginator = CachedCountPaginator(Group.objects.all(), 1,
+                                         key='created', estimate_above=1)
+        page = paginator.get_page(5)
+        self.assertEqual(list(page), [groups[0]])
+        self.assertFalse(page.has_next())
+        self.assertTrue(page.has_previous())
+
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MediaServingTestClass(TestCase):
+    url = '/media/posts/picture.jpg'
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        os.makedirs(os.path.join(TEMP_MEDIA_ROOT, 'posts'), exist_ok=True)
+        cls.content = bytes(range(256)) * 4
+        with open(os.path.join(TEMP_MEDIA_ROOT, 'posts', 'picture.jpg'),
+                  'wb') as picture:
+            picture.write(cls.content)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_repeat_fetch_not_modified(self):
+        """Повторный запрос с ETag или датой получает 304 без тела."""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertIn('max-age', response['Cache-Control'])
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE':
+                         response['Last-Modified']}):
+            repeat = self.client.get(self.url, **headers)
+            self.assertEqual(repeat.status_code, 304)
+            self.assertEqual(repeat.content, b'')
+            self.assertEqual(repeat['ETag'], response['ETag'])
+
+    def test_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 10-19/1024')
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.content[10:20])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=-4')
+        self.assertEqual(b''.join(response.streaming_content),
+                         self.content[-4:])
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=10-19',
+                                   HTTP_IF_RANGE='"stale"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_outside_media_root_not_found(self):
+        self.assertEqual(
+            self.client.get('/media/../manage.py').status_code, 404)
+        self.assertEqual(self.client.get('/media/posts/').status_code, 404)
+
+    @override_settings(MEDIA_OFFLOAD='x-accel-redirect')
+    def test_offload_to_nginx(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'],
+                         '/protected-media/posts/picture.jpg')
+        self.assertEqual(response.content, b'')
+
+
+class LoadTestTestClass(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        reader = User.objects.create_user(username='reader')
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='-')
+        for number in range(3):
+            Post.objects.create(author=author, group=group,
+                                text=f'Пост номер {number}')
+        Follow.objects.create(user=reader, author=author)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_all_scenarios(self):
+        """Сценарии проходят через WSGI без ошибок, запросы учтены."""
+        plan = make_plan(dict.fromkeys(SCENARIOS, 1), requests=60)
+        samples, elapsed = run(plan, workers=1)
+        self.assertFalse([sample for sample in samples
+                          if sample.status >= 400])
+        views = {row['view']: row for row in report(samples, elapsed)}
+        for view in ('posts:index', 'posts:follow_index', 'posts:search',
+                     'posts:post_create', 'posts:add_comment',
+                     'posts:profile_follow'):
+            self.assertIn(view, views)
+        self.assertGreater(views['posts:index']['queries'], 0)
+        self.assertGreater(views['posts:index']['hit_rate'], 0)
+        self.assertTrue(Comment.objects.exists())
@@ -1,4 +1,23 @@
+import mimetypes
+import os
+import posixpath
+import re
+import stat
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse
 from django.shortcuts import render
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.encoding import iri_to_uri
+from django.utils.http import http_date, parse_http_date_safe
+from django.views.decorators.http import require_safe
+from sorl.thumbnail.conf import settings as sorl_settings
+
+from .storage import touch_media
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
 
 
 def page_not_found(request, exception):
@@ -15,3 +34,125 @@ def server_error(request):
 
 def permission_denied(request, exception):
     return render(request, 'core/403.html', status=403)
+
+
+class FileRange:
+    """Часть открытого файла: read() не заходит за конец диапазона."""
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size) if size else b''
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def media_etag(file_stat):
+    # Сильный ETag из метаданных: содержимое файла не читается.
+    return '"%x-%x-%x"' % (file_stat.st_ino, file_stat.st_mtime_ns,
+                           file_stat.st_size)
+
+
+def byte_range(request, size, etag, last_modified):
+    """(начало, конец) из заголовка Range или None — отдать весь файл.
+
+    Несколько диапазонов и непонятный заголовок дают весь файл, как
+    разрешает RFC 7233; диапазон за концом файла — ValueError.
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag and (
+            parse_http_date_safe(if_range) != last_modified):
+        # Файл изменился с тех пор, как клиент скачал начало.
+        return None
+    start, end = match.groups()
+    if not start:
+        length = int(end)
+        if not length:
+            raise ValueError('Пустой диапазон')
+        return max(size - length, 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size:
+        raise ValueError('Диапазон за концом файла')
+    if end < start:
+        return None
+    return start, end
+
+
+def _media_response(request, path, full_path, file_stat, etag):
+    content_type = (mimetypes.guess_type(full_path)[0]
+                    or 'application/octet-stream')
+    if settings.MEDIA_OFFLOAD == 'x-accel-redirect':
+        # Файл и диапазоны отдаёт nginx из internal-локации.
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = iri_to_uri(
+            settings.MEDIA_ACCEL_PREFIX + path)
+        return response
+    if settings.MEDIA_OFFLOAD == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+        return response
+    size = file_stat.st_size
+    try:
+        requested = byte_range(request, size, etag, int(file_stat.st_mtime))
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    media_file = open(full_path, 'rb')
+    if requested is None:
+        response = FileResponse(media_file, content_type=content_type)
+        response['Content-Length'] = size
+    else:
+        start, end = requested
+        media_file.seek(start)
+        # До конца файла отдаём сам файл: wsgi.file_wrapper сервера
+        # (gunicorn, uWSGI) передаст его через os.sendfile.
+        content = (media_file if end == size - 1
+                   else FileRange(media_file, end - start + 1))
+        response = FileResponse(content, status=206,
+                                content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = end - start + 1
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve_media(request, path):
+    """Отдаёт файл из MEDIA_ROOT с ETag, 304 и Range.
+
+    Имена картинок и миниатюр выводятся из содержимого, поэтому файл
+    по одному адресу не меняется и кэшируется браузером надолго.
+    """
+    name = posixpath.normpath(path).lstrip('/')
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, name)
+        file_stat = os.stat(full_path)
+    except (SuspiciousFileOperation, OSError):
+        raise Http404
+    if not stat.S_ISREG(file_stat.st_mode):
+        raise Http404
+    if name.startswith(sorl_settings.THUMBNAIL_PREFIX):
+        touch_media({name: None})
+    etag = media_etag(file_stat)
+    response = get_conditional_response(
+        request, etag=etag, last_modified=int(file_stat.st_mtime))
+    if response is None:
+        response = _media_response(request, path, full_path, file_stat, etag)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(file_stat.st_mtime)
+    patch_cache_control(response, public=True,
+                        max_age=settings.MEDIA_CACHE_MAX_AGE)
+    return response
@@ -1,6 +1,8 @@
 from django.contrib import admin
+from django.db import connection
 from .models import Post
 from .models import Group
+from .search import fts_query, matching_ids_sql
 
 
 @admin.register(Post)
@@ -11,6 +13,17 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('pub_date',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # В SQLite ищем по индексу FTS5 вместо LIKE '%…%' по всей таблице.
+        match = fts_query(search_term)
+        if not match or connection.vendor != 'sqlite':
+            return super().get_search_results(
+                request, queryset, search_term)
+        queryset = queryset.extra(
+            where=[f'{Post._meta.db_table}.id IN ({matching_ids_sql()})'],
+            params=[match])
+        return queryset, False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -0,0 +1,138 @@
+"""Денормализованные счётчики постов, комментариев, подписок и ссылок
+на файлы картинок.
+
+Счётчики меняются атомарно через F()-выражения при создании и
+удалении Post, Comment и Follow, а расхождения, накопившиеся из-за
+массовых операций мимо сигналов, исправляет reconcile_counters.
+"""
+from django.core.exceptions import SuspiciousFileOperation
+from django.db import transaction
+from django.db.models import Count, F
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import Comment, Follow, MediaFile, Post, User, UserStats
+
+
+def change_user_stats(user_id, **deltas):
+    """Сдвигает счётчики пользователя; строка создаётся при увеличении."""
+    changes = {field: F(field) + delta for field, delta in deltas.items()}
+    # Не уводим счётчик ниже нуля, если он уже разошёлся с данными.
+    floors = {f'{field}__gte': -delta
+              for field, delta in deltas.items() if delta < 0}
+    if UserStats.objects.filter(user_id=user_id, **floors).update(**changes):
+        return
+    # При удалении пользователя его строка со счётчиками может
+    # уже отсутствовать, поэтому создаём её только при росте.
+    if not floors:
+        UserStats.objects.get_or_create(user_id=user_id)
+        UserStats.objects.filter(user_id=user_id).update(**changes)
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id, comments_count__gte=-delta).update(
+        comments_count=F('comments_count') + delta)
+
+
+def change_media_refs(name, delta, delete_thumbnails=True):
+    """Сдвигает число ссылок на файл; файл без ссылок удаляется."""
+    if delta > 0:
+        MediaFile.objects.get_or_create(name=name)
+        MediaFile.objects.filter(name=name).update(refs=F('refs') + delta)
+        return
+    MediaFile.objects.filter(name=name, refs__gte=-delta).update(
+        refs=F('refs') + delta)
+    if MediaFile.objects.filter(name=name, refs=0).delete()[0]:
+        transaction.on_commit(
+            lambda: _delete_unused_media(name, delete_thumbnails))
+
+
+def _delete_unused_media(name, delete_thumbnails):
+    # Пока шла транзакция, ту же картинку могли загрузить снова.
+    if MediaFile.objects.filter(name=name).exists():
+        return
+    image = ImageFile(name, Post._meta.get_field('image').storage)
+    # Вместе с записью хранилища ключей удаляются и миниатюры.
+    default.kvstore.delete(image, delete_thumbnails)
+    try:
+        image.delete()
+    except (OSError, SuspiciousFileOperation):
+        pass
+
+
+def user_stats(user):
+    """Счётчики пользователя; отсутствующие вычисляются и сохраняются."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        stats, _ = UserStats.objects.get_or_create(
+            user=user, defaults=_actual_user_counts([user.pk])[user.pk])
+        user.stats = stats
+        return stats
+
+
+def _grouped_counts(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids}).order_by()
+        .values_list(field).annotate(total=Count('pk'))
+    )
+
+
+def _actual_user_counts(user_ids):
+    posts = _grouped_counts(Post.objects.all(), 'author', user_ids)
+    followers = _grouped_counts(Follow.objects.all(), 'author', user_ids)
+    following = _grouped_counts(Follow.objects.all(), 'user', user_ids)
+    return {
+        user_id: {
+            'posts_count': posts.get(user_id, 0),
+            'followers_count': followers.get(user_id, 0),
+            'following_count': following.get(user_id, 0),
+        }
+        for user_id in user_ids
+    }
+
+
+def chunks(queryset, chunk_size):
+    """Первичные ключи queryset порциями, без OFFSET."""
+    last_pk = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk')
+                   .values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return
+        yield pks
+        last_pk = pks[-1]
+
+
+def reconcile_user_stats(chunk_size=1000):
+    """Исправляет счётчики пользователей; отдаёт число правок на порцию."""
+    for user_ids in chunks(User.objects.all(), chunk_size):
+        actual = _actual_user_counts(user_ids)
+        stored = {stats.user_id: stats for stats
+                  in UserStats.objects.filter(user_id__in=user_ids)}
+        missing = [UserStats(user_id=user_id, **actual[user_id])
+                   for user_id in user_ids if user_id not in stored]
+        UserStats.objects.bulk_create(missing)
+        fixed = len(missing)
+        for user_id, stats in stored.items():
+            counts = actual[user_id]
+            if any(getattr(stats, field) != value
+                   for field, value in counts.items()):
+                UserStats.objects.filter(user_id=user_id).update(**counts)
+                fixed += 1
+        yield len(user_ids), fixed
+
+
+def reconcile_comments_count(chunk_size=1000):
+    """Исправляет Post.comments_count; отдаёт число правок на порцию."""
+    for post_ids in chunks(Post.objects.all(), chunk_size):
+        actual = _grouped_counts(Comment.objects.all(), 'post', post_ids)
+        stored = Post.objects.filter(pk__in=post_ids).values_list(
+            'pk', 'comments_count')
+        fixed = 0
+        for post_id, comments_count in stored:
+            if comments_count != actual.get(post_id, 0):
+                Post.objects.filter(pk=post_id).update(
+                    comments_count=actual.get(post_id, 0))
+                fixed += 1
+        yield len(post_ids), fixed
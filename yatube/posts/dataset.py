@@ -0,0 +1,52 @@
+"""Синтетические данные для замеров: слова, тексты и картинки.
+
+Всё выбирается из переданного random.Random, поэтому одно и то же
+зерно даёт одни и те же данные.
+"""
+import io
+from itertools import accumulate
+
+from PIL import Image, ImageDraw, ImageFilter
+
+
+def vocabulary(rng, size=5000):
+    """Словарь из Faker в случайном порядке; порядок задаёт частоту."""
+    from faker import Faker
+    faker = Faker('ru_RU')
+    faker.seed_instance(rng.random())
+    words = list(dict.fromkeys(
+        word.lower() for word in faker.words(nb=size)))
+    rng.shuffle(words)
+    return words
+
+
+def power_law(count, exponent=1.0):
+    """Накопленные веса рангов 1..count для rng.choices(cum_weights=).
+
+    Вес ранга r пропорционален 1 / r**exponent: немногие элементы
+    выбираются почти всегда, остальные — редко, как авторы и слова
+    в живых данных.
+    """
+    return list(accumulate(1 / rank ** exponent
+                           for rank in range(1, count + 1)))
+
+
+def text(rng, words, cum_weights, low=5, high=60):
+    return ' '.join(rng.choices(words, cum_weights=cum_weights,
+                                k=rng.randint(low, high)))
+
+
+def sample_image(rng, size=(1600, 1200)):
+    """JPEG из размытых цветных кругов, как фото без шума."""
+    background = tuple(rng.randrange(256) for _ in range(3))
+    image = Image.new('RGB', size, background)
+    draw = ImageDraw.Draw(image)
+    for _ in range(30):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        radius = rng.randint(size[0] // 30, size[0] // 4)
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                     fill=tuple(rng.randrange(256) for _ in range(3)))
+    image = image.filter(ImageFilter.GaussianBlur(4))
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
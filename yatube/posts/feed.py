@@ -0,0 +1,231 @@
+"""Лента подписок с разносом постов при записи (fan-out on write).
+
+Каждый новый пост сразу раскладывается в таблицу Timeline всех
+подписчиков автора, поэтому чтение ленты сводится к одному
+диапазонному запросу по индексу (user, -pub_date).
+
+Авторы, у которых подписчиков не меньше FEED_PULL_THRESHOLD, не
+раскладываются: их свежие посты подмешиваются при чтении k-путевым
+слиянием по pub_date (гибридная схема push/pull).
+
+Запись поста не обрезает ленты подписчиков: записи сверх
+FOLLOW_TIMELINE_LENGTH удаляет по расписанию команда trim_timelines.
+"""
+import heapq
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Count
+
+from core.paginator import NEXT, CursorPaginator
+from .models import Follow, Post, Timeline, UserStats
+from .utils import batches, for_listing
+
+BATCH_SIZE = 500
+PULLED_AUTHORS_KEY = 'feed:pulled-authors'
+
+
+def pulled_author_ids():
+    """Авторы, чьи посты подмешиваются в ленту при чтении."""
+    author_ids = cache.get(PULLED_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = set(
+            UserStats.objects
+            .filter(followers_count__gte=settings.FEED_PULL_THRESHOLD)
+            .values_list('user_id', flat=True)
+        )
+        cache.set(PULLED_AUTHORS_KEY, author_ids,
+                  settings.FEED_PULL_CACHE_TIMEOUT)
+    return author_ids
+
+
+def _insert(entries):
+    Timeline.objects.bulk_create(
+        entries, batch_size=BATCH_SIZE, ignore_conflicts=True)
+
+
+def trim_timelines(user_ids):
+    """Удаляет из лент записи сверх FOLLOW_TIMELINE_LENGTH.
+
+    Лишние записи отбираются оконной функцией по индексу
+    (user, -pub_date, -post): один DELETE на порцию пользователей.
+    """
+    qn = connection.ops.quote_name
+    timeline = qn(Timeline._meta.db_table)
+    with connection.cursor() as cursor:
+        for batch in batches(user_ids, BATCH_SIZE):
+            marks = ', '.join(['%s'] * len(batch))
+            cursor.execute(
+                f'DELETE FROM {timeline} WHERE id IN ('
+                f'SELECT id FROM (SELECT id, ROW_NUMBER() OVER ('
+                f'PARTITION BY user_id ORDER BY pub_date DESC, post_id DESC'
+                f') AS position FROM {timeline} WHERE user_id IN ({marks})'
+                f') ranked WHERE position > %s)',
+                [*batch, settings.FOLLOW_TIMELINE_LENGTH])
+
+
+def overfull_timelines():
+    """Пользователи, в лентах которых больше FOLLOW_TIMELINE_LENGTH записей.
+
+    Один проход GROUP BY по индексу ленты — для периодической обрезки.
+    """
+    return (
+        Timeline.objects.values('user_id')
+        .annotate(entries=Count('pk'))
+        .filter(entries__gt=settings.FOLLOW_TIMELINE_LENGTH)
+        .values_list('user_id', flat=True)
+    )
+
+
+def fan_out_posts(posts):
+    """Доставляет новые посты в ленты всех подписчиков их авторов.
+
+    Возвращает id подписчиков, чьи ленты изменились.
+    """
+    pulled = pulled_author_ids()
+    posts = [post for post in posts if post.author_id not in pulled]
+    if not posts:
+        return set()
+    followers = {}
+    for user_id, author_id in Follow.objects.filter(
+            author_id__in={post.author_id for post in posts}
+    ).values_list('user_id', 'author_id'):
+        followers.setdefault(author_id, []).append(user_id)
+    _insert(
+        Timeline(user_id=user_id, post_id=post.pk, pub_date=post.pub_date)
+        for post in posts for user_id in followers.get(post.author_id, ())
+    )
+    # Ленты не обрезаются при каждой записи: это перебор всех лент
+    # подписчиков. Лишние записи чтению не мешают, их удаляет команда
+    # trim_timelines.
+    return {user_id for ids in followers.values() for user_id in ids}
+
+
+def fan_out_post(post):
+    """Доставляет новый пост в ленты всех подписчиков автора."""
+    fan_out_posts([post])
+
+
+def _latest_posts(authors):
+    cap = settings.FOLLOW_TIMELINE_LENGTH
+    return (
+        Post.objects.filter(author__in=authors)
+        .order_by('-pub_date', '-pk')
+        .values_list('pk', 'pub_date')[:cap]
+    )
+
+
+def backfill_author(user_id, author_id):
+    """Добавляет в ленту последние посты автора после подписки."""
+    if author_id in pulled_author_ids():
+        return
+    _insert(
+        Timeline(user_id=user_id, post_id=pk, pub_date=pub_date)
+        for pk, pub_date in _latest_posts([author_id])
+    )
+    trim_timelines([user_id])
+
+
+def remove_author(user_id, author_id):
+    """Убирает посты автора из ленты после отписки."""
+    Timeline.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild_timeline(user_id):
+    """Пересобирает ленту пользователя с нуля по его подпискам."""
+    rebuild_timelines([user_id])
+
+
+def rebuild_timelines(user_ids):
+    """rebuild_timeline() для многих пользователей одним INSERT … SELECT.
+
+    Последние FOLLOW_TIMELINE_LENGTH постов каждой ленты отбираются
+    оконной функцией в СУБД, без объектов Timeline в Python.
+    """
+    user_ids = list(user_ids)
+    pulled = list(pulled_author_ids())
+    Timeline.objects.filter(user_id__in=user_ids).delete()
+    qn = connection.ops.quote_name
+    timeline, follow, post = (qn(model._meta.db_table)
+                              for model in (Timeline, Follow, Post))
+    marks = ', '.join(['%s'] * len(user_ids))
+    excluded = ''
+    if pulled:
+        excluded = 'AND f.author_id NOT IN (%s)' % ', '.join(
+            ['%s'] * len(pulled))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {timeline} (user_id, post_id, pub_date) '
+            f'SELECT user_id, id, pub_date FROM ('
+            f'SELECT f.user_id, p.id, p.pub_date, ROW_NUMBER() OVER ('
+            f'PARTITION BY f.user_id ORDER BY p.pub_date DESC, p.id DESC'
+            f') AS position FROM {follow} f '
+            f'JOIN {post} p ON p.author_id = f.author_id '
+            f'WHERE f.user_id IN ({marks}) {excluded}'
+            f') latest WHERE position <= %s',
+            [*user_ids, *pulled, settings.FOLLOW_TIMELINE_LENGTH])
+
+
+def pulled_follows(user):
+    """Популярные авторы из подписок пользователя."""
+    return list(
+        Follow.objects.filter(user=user, author_id__in=pulled_author_ids())
+        .values_list('author_id', flat=True)
+    )
+
+
+def follow_feed(user, pulled):
+    """Источники ленты: материализованная часть и «тянущиеся» авторы."""
+    sources = [Timeline.objects.filter(user=user)]
+    sources.extend(for_listing(Post.objects.filter(author_id=author_id))
+                   for author_id in pulled)
+    return sources
+
+
+class FeedPaginator(CursorPaginator):
+    """Курсорный паджинатор поверх нескольких упорядоченных источников.
+
+    Первый источник — записи Timeline: окно читается диапазоном
+    индекса (user, -pub_date, -post), а посты выбираются по pk только
+    для этого окна. Остальные источники — посты «тянущихся» авторов,
+    каждый читается по своему индексу не дальше одной страницы от
+    курсора. Результаты сливаются кучей по (pub_date, pk). Страницы по
+    номеру не поддерживаются: первая страница — это страница без курсора.
+    """
+
+    def __init__(self, sources, per_page, **kwargs):
+        timeline, *pulled = sources
+        super().__init__(timeline, per_page, **kwargs)
+        self.timeline = timeline.order_by(f'-{self.key}', '-post_id')
+        self.sources = [source.order_by(f'-{self.key}', '-pk')
+                        for source in pulled]
+
+    def get_page(self, number):
+        return self._cursor_page(NEXT, None, None)
+
+    def timeline_window(self, direction, value, pk, limit):
+        """Посты окна материализованной ленты, без порядка."""
+        entries = self.window(self.timeline, direction, value, pk,
+                              pk_field='post_id')
+        # Порядок задаёт окно; посты страницы сортируются в Python.
+        return for_listing(Post.objects.filter(
+            pk__in=entries.values('post_id')[:limit])).order_by()
+
+    def _fetch(self, direction, value, pk, limit):
+        reverse = direction == NEXT
+        runs = [sorted(self.timeline_window(direction, value, pk, limit),
+                       key=self._position, reverse=reverse)]
+        runs.extend(self.window(source, direction, value, pk)[:limit]
+                    for source in self.sources)
+        merged = heapq.merge(*runs, key=self._position, reverse=reverse)
+        items = []
+        for post in merged:
+            # Пост автора, перешедшего порог, может быть в обоих источниках.
+            if items and items[-1].pk == post.pk:
+                continue
+            items.append(post)
+            if len(items) == limit:
+                break
+        return items
@@ -1,4 +1,7 @@
 from django import forms
+from django.core.files.uploadedfile import UploadedFile
+
+from .ingest import ingest
 from .models import Post, Comment
 
 
@@ -7,6 +10,13 @@ class PostForm(forms.ModelForm):
         model = Post
         fields = ('group', 'text', 'image')
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        if isinstance(image, UploadedFile):
+            # Хранится не оригинал, а уменьшенная копия без EXIF.
+            image = ingest(image)
+        return image
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,155 @@
+"""Приём картинок постов: проверка, уменьшение и перекодирование.
+
+Загруженная картинка проверяется по размерам, поворачивается по EXIF,
+уменьшается до IMAGE_MAX_EDGE по длинной стороне и сохраняется заново
+без метаданных. Декодирование и сжатие выполняются в пуле процессов,
+чтобы они не занимали GIL процесса, который обслуживает запросы.
+"""
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation, ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, features
+
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp', 'GIF': 'gif'}
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'PNG': 'image/png',
+                 'WEBP': 'image/webp', 'GIF': 'image/gif'}
+EXIF_ORIENTATION = 0x0112
+
+_executor = None
+_lock = threading.Lock()
+
+
+class ImageRejected(ValueError):
+    pass
+
+
+def _output_format(image, preferred):
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        # JPEG не хранит прозрачность.
+        return 'WEBP' if features.check('webp') else 'PNG'
+    if preferred == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return preferred
+
+
+def process_image(data, max_edge, max_pixels, preferred_format, quality):
+    """Возвращает (байты, формат, ширина, высота, цвет) картинки.
+
+    Выполняется в дочернем процессе, поэтому не использует Django.
+    """
+    try:
+        return _process(Image.open(io.BytesIO(data)), data, max_edge,
+                        max_pixels, preferred_format, quality)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as error:
+        raise ImageRejected('Файл повреждён или не является картинкой.') \
+            from error
+
+
+def _process(image, data, max_edge, max_pixels, preferred_format, quality):
+    width, height = image.size
+    if not width or not height:
+        raise ImageRejected('У картинки нет размеров.')
+    if width * height > max_pixels:
+        raise ImageRejected(
+            f'Картинка {width}×{height} больше {max_pixels} пикселей.')
+    if getattr(image, 'n_frames', 1) > 1:
+        # Анимацию не перекодируем: кадры пропали бы.
+        return data, image.format, width, height, average_color(image)
+    # JPEG декодируется сразу в уменьшенном масштабе (DCT scaling).
+    image.draft('RGB', (max_edge, max_edge))
+    image = ImageOps.exif_transpose(image)
+    output_format = _output_format(image, preferred_format)
+    if output_format == 'JPEG':
+        image = image.convert('RGB')
+    elif image.mode == 'P':
+        image = image.convert('RGBA')
+    image.thumbnail((max_edge, max_edge), Image.LANCZOS, reducing_gap=3.0)
+    buffer = io.BytesIO()
+    # Метаданные (EXIF, ICC, комментарии) не переносятся в новый файл.
+    image.save(buffer, output_format, quality=quality, optimize=True,
+               progressive=output_format == 'JPEG')
+    return (buffer.getvalue(), output_format, image.width, image.height,
+            average_color(image))
+
+
+def average_color(image):
+    """Средний цвет картинки в виде #rrggbb — фон заглушки."""
+    pixel = image.convert('RGB').resize((1, 1), Image.BOX).getpixel((0, 0))
+    return '#%02x%02x%02x' % pixel
+
+
+def image_metadata(image_file):
+    """Поля Post с размером и цветом картинки из файла.
+
+    Размер читается из заголовка с учётом поворота по EXIF, а цвет
+    считается по уменьшенной при декодировании копии.
+    """
+    image = Image.open(image_file)
+    width, height = image.size
+    if image.getexif().get(EXIF_ORIENTATION) in (5, 6, 7, 8):
+        width, height = height, width
+    image.draft('RGB', (64, 64))
+    return {
+        'image_width': width,
+        'image_height': height,
+        'image_color': average_color(image),
+    }
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # spawn: в процессе уже работают потоки (пул миниатюр),
+            # а fork копирует их блокировки в неопределённом состоянии.
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.IMAGE_INGEST_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def ingest(uploaded):
+    """Обрабатывает загруженный файл и возвращает новый файл для поля."""
+    uploaded.seek(0)
+    args = (uploaded.read(), settings.IMAGE_MAX_EDGE,
+            settings.IMAGE_MAX_PIXELS, settings.IMAGE_INGEST_FORMAT,
+            settings.IMAGE_INGEST_QUALITY)
+    try:
+        if settings.IMAGE_INGEST_WORKERS:
+            result = _get_executor().submit(process_image, *args).result()
+        else:
+            result = process_image(*args)
+    except ImageRejected as error:
+        raise ValidationError(str(error), code='invalid_image')
+    data, output_format, width, height, color = result
+    stem = os.path.splitext(os.path.basename(uploaded.name))[0]
+    name = f'{stem}.{EXTENSIONS.get(output_format, "img")}'
+    image = SimpleUploadedFile(name, data, CONTENT_TYPES.get(output_format))
+    # Размер уже известен: сигнал pre_save не будет открывать файл.
+    image.metadata = {
+        'image_width': width,
+        'image_height': height,
+        'image_color': color,
+    }
+    return image
+
+
+def read_metadata(field_file):
+    """image_metadata() для файла поля; недоступный файл даёт пустые поля."""
+    try:
+        if field_file._committed:
+            with field_file.storage.open(field_file.name) as image_file:
+                return image_metadata(image_file)
+        field_file.file.seek(0)
+        try:
+            return image_metadata(field_file.file)
+        finally:
+            field_file.file.seek(0)
+    except (OSError, SuspiciousFileOperation, Image.DecompressionBombError):
+        return {'image_width': None, 'image_height': None, 'image_color': ''}
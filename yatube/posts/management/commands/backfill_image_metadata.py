@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import chunks
+from posts.ingest import read_metadata
+from posts.models import Post
+
+FIELDS = ('image_width', 'image_height', 'image_color')
+
+
+class Command(BaseCommand):
+    help = ('Заполняет размер и средний цвет картинок постов, '
+            'загруженных до появления этих полей.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        pending = Post.objects.exclude(image='').filter(
+            image_width__isnull=True)
+        filled = failed = 0
+        for post_ids in chunks(pending, options['chunk_size']):
+            posts = list(Post.objects.filter(pk__in=post_ids).only(
+                'image', *FIELDS))
+            for post in posts:
+                for field, value in read_metadata(post.image).items():
+                    setattr(post, field, value)
+                if post.image_width is None:
+                    failed += 1
+                else:
+                    filled += 1
+            # bulk_update не вызывает сигналы и не сбрасывает кэши лент.
+            Post.objects.bulk_update(posts, FIELDS)
+            self.stdout.write(
+                f'Заполнено {filled}, не удалось прочитать {failed}')
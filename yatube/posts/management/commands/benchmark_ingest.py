@@ -0,0 +1,94 @@
+import io
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image, ImageDraw, ImageFilter
+
+from posts.ingest import process_image
+
+THUMBNAIL_SIZE = (960, 339)
+
+
+class Command(BaseCommand):
+    help = ('Замеряет приём картинок: пропускную способность в запросе '
+            'и в пуле процессов, объём и время нарезки миниатюр.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--count', type=int, default=24)
+        parser.add_argument('--width', type=int, default=4032)
+        parser.add_argument('--height', type=int, default=3024)
+        parser.add_argument('--workers', type=int,
+                            default=settings.IMAGE_INGEST_WORKERS or 2)
+        parser.add_argument('--random-seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['random_seed'])
+        size = (options['width'], options['height'])
+        samples = [self.sample(size, rng) for _ in range(options['count'])]
+        arguments = (settings.IMAGE_MAX_EDGE, settings.IMAGE_MAX_PIXELS,
+                     settings.IMAGE_INGEST_FORMAT,
+                     settings.IMAGE_INGEST_QUALITY)
+
+        started = time.perf_counter()
+        results = [process_image(data, *arguments) for data in samples]
+        inline = time.perf_counter() - started
+
+        with ProcessPoolExecutor(options['workers']) as executor:
+            # Запуск процессов не входит в замер.
+            list(executor.map(process_image, samples[:1],
+                              *([value] for value in arguments)))
+            started = time.perf_counter()
+            list(executor.map(
+                process_image, samples,
+                *([value] * len(samples) for value in arguments)))
+            pooled = time.perf_counter() - started
+
+        count = len(samples)
+        original_bytes = sum(map(len, samples))
+        stored_bytes = sum(len(result[0]) for result in results)
+        self.stdout.write(
+            f'{count} картинок {size[0]}×{size[1]}: в запросе '
+            f'{count / inline:.1f} шт/с, в пуле из {options["workers"]} '
+            f'процессов {count / pooled:.1f} шт/с')
+        self.stdout.write(
+            f'Объём: {original_bytes / 2**20:.1f} МБ → '
+            f'{stored_bytes / 2**20:.1f} МБ')
+        self.stdout.write(
+            f'Миниатюра {THUMBNAIL_SIZE[0]}×{THUMBNAIL_SIZE[1]}: из '
+            f'оригинала {self.thumbnail_ms(samples):.0f} мс, после приёма '
+            f'{self.thumbnail_ms(r[0] for r in results):.0f} мс на картинку')
+
+    @staticmethod
+    def sample(size, rng):
+        """Снимок «с телефона»: шум, крупные детали, EXIF, качество 95."""
+        image = Image.effect_noise(size, 40).convert('RGB')
+        draw = ImageDraw.Draw(image)
+        for _ in range(60):
+            x, y = rng.randrange(size[0]), rng.randrange(size[1])
+            radius = rng.randint(50, 600)
+            draw.ellipse((x - radius, y - radius, x + radius, y + radius),
+                         fill=tuple(rng.randrange(256) for _ in range(3)))
+        image = image.filter(ImageFilter.GaussianBlur(2))
+        exif = Image.Exif()
+        exif[0x010F] = 'Phone'
+        exif[0x0112] = 1
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=95, exif=exif)
+        return buffer.getvalue()
+
+    @staticmethod
+    def thumbnail_ms(images):
+        # Та же работа, что у sorl-thumbnail: декодировать и обрезать.
+        timings = []
+        for data in images:
+            started = time.perf_counter()
+            image = Image.open(io.BytesIO(data))
+            image = image.convert('RGB')
+            image.thumbnail((THUMBNAIL_SIZE[0], THUMBNAIL_SIZE[0]),
+                            Image.LANCZOS)
+            image.crop((0, 0) + THUMBNAIL_SIZE).save(io.BytesIO(), 'JPEG')
+            timings.append((time.perf_counter() - started) * 1000)
+        return sum(timings) / len(timings)
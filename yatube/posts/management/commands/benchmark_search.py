@@ -0,0 +1,91 @@
+import random
+import statistics
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import dataset
+from posts.models import Post, User
+from posts.search import SearchPaginator, fts_query, matching_ids_sql
+
+SEED_USERNAME = 'search-benchmark'
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает поиск LIKE и FTS5 по постам; '
+            'при --seed сначала добавляет синтетические посты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Сколько постов добавить перед замером.')
+        parser.add_argument('--batch-size', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--random-seed', type=int, default=0)
+        parser.add_argument('terms', nargs='*')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['random_seed'])
+        vocabulary = dataset.vocabulary(rng)
+        if options['seed']:
+            self.seed(options['seed'], options['batch_size'],
+                      vocabulary, rng)
+        # Частые, средние и редкие слова ведут себя по-разному: LIKE
+        # быстро находит 10 частых совпадений, но сканирует всю таблицу
+        # ради редких и для подсчёта (как в поиске админки).
+        terms = options['terms'] or [
+            vocabulary[0], vocabulary[len(vocabulary) // 10],
+            vocabulary[-1]]
+        repeat = options['repeat']
+        self.stdout.write(f'Постов в базе: {Post.objects.count()}')
+        for term in terms:
+            like_page = self.measure(repeat, lambda: list(
+                Post.objects.filter(text__icontains=term)
+                .order_by('-pub_date')[:10]))
+            fts_page = self.measure(repeat, lambda: list(
+                SearchPaginator(
+                    term, 10, rank_window=settings.SEARCH_RANK_WINDOW)
+                .get_cursor_page(None)))
+            like_count = self.measure(repeat, lambda: (
+                Post.objects.filter(text__icontains=term).count()))
+            fts_count = self.measure(repeat, lambda: self.fts_count(term))
+            self.stdout.write(
+                f'{term!r}: страница LIKE {like_page:.1f} мс / '
+                f'FTS5 {fts_page:.1f} мс; подсчёт LIKE {like_count:.1f} мс '
+                f'/ FTS5 {fts_count:.1f} мс')
+
+    @staticmethod
+    def fts_count(term):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM ({matching_ids_sql()})',
+                [fts_query(term)])
+            return cursor.fetchone()[0]
+
+    def seed(self, total, batch_size, vocabulary, rng):
+        author, _ = User.objects.get_or_create(username=SEED_USERNAME)
+        # Степенное распределение слов похоже на живой текст: частые
+        # слова встречаются почти везде, редкие — в единицах постов.
+        weights = dataset.power_law(len(vocabulary))
+        started = time.perf_counter()
+        for offset in range(0, total, batch_size):
+            size = min(batch_size, total - offset)
+            with transaction.atomic():
+                Post.objects.bulk_create(
+                    Post(author=author,
+                         text=dataset.text(rng, vocabulary, weights))
+                    for _ in range(size)
+                )
+            self.stdout.write(f'Добавлено {offset + size} из {total}')
+        self.stdout.write(
+            f'Заполнение: {time.perf_counter() - started:.0f} с')
+
+    @staticmethod
+    def measure(repeat, query):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,186 @@
+import json
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from sorl.thumbnail import default
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+from sorl.thumbnail.kvstores.base import add_prefix, del_prefix
+from sorl.thumbnail.models import KVStore
+
+from core.storage import ACCESS_BUCKET, media_accessed, walk_files
+from posts.models import MediaFile, Post
+from posts.thumbnails import forget_thumbnails
+from posts.utils import batches
+from posts.versions import bump, page_scopes
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки постов, на которые не ссылается ни один '
+            'пост, миниатюры удалённых картинок и давно не открывавшиеся '
+            'миниатюры сверх предела объёма. Файлы и записи хранилища '
+            'ключей обходятся порциями, так что команду можно запускать '
+            'на работающем сайте.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500)
+        parser.add_argument(
+            '--min-age', type=int, default=24 * 60 * 60,
+            help='Не трогать файлы моложе стольких секунд: картинку могли '
+                 'только что загрузить, а миниатюру — только что открыть.')
+        parser.add_argument(
+            '--max-bytes', type=int, default=settings.THUMBNAIL_STORAGE_LIMIT,
+            help='Предел объёма миниатюр в байтах.')
+        parser.add_argument(
+            '--max-idle', type=int, default=settings.THUMBNAIL_MAX_IDLE,
+            help='Удалять миниатюры, которые не открывали столько секунд.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Только посчитать, ничего не удалять.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        self.chunk_size = options['chunk_size']
+        self.min_age = options['min_age']
+        self.now = time.time()
+        removed = self.collect_originals()
+        self.stdout.write(f'Картинок без постов: {removed}')
+        removed = self.collect_thumbnails()
+        self.stdout.write(f'Миниатюр удалённых картинок: {removed}')
+        removed, freed = self.evict_thumbnails(options['max_bytes'],
+                                               options['max_idle'])
+        self.stdout.write(
+            f'Вытеснено миниатюр: {removed}, {freed / 2**20:.1f} МБ')
+
+    def collect_originals(self):
+        field = Post._meta.get_field('image')
+        storage = field.storage
+        old_files = (
+            name for name, stat in walk_files(storage, field.upload_to)
+            if self.now - stat.st_mtime > self.min_age)
+        removed = 0
+        for names in batches(old_files, self.chunk_size):
+            # Ссылки проверяются прямо перед удалением порции.
+            referenced = set(Post.objects.filter(image__in=names)
+                             .values_list('image', flat=True))
+            referenced.update(MediaFile.objects.filter(name__in=names)
+                              .values_list('name', flat=True))
+            for name in set(names) - referenced:
+                removed += 1
+                if not self.dry_run:
+                    image = ImageFile(name, storage)
+                    default.kvstore.delete(image)
+                    storage.delete(name)
+        return removed
+
+    def kvstore_rows(self, identity):
+        """Записи хранилища ключей порциями по возрастанию ключа."""
+        prefix = add_prefix('', identity)
+        last_key = prefix
+        while True:
+            rows = list(
+                KVStore.objects.filter(key__startswith=prefix,
+                                       key__gt=last_key)
+                .order_by('key').values_list('key', 'value')
+                [:self.chunk_size])
+            if not rows:
+                return
+            yield rows
+            last_key = rows[-1][0]
+
+    def collect_thumbnails(self):
+        """Миниатюры картинок, на которые больше не ссылаются посты.
+
+        Такие остаются после shard_media: он удаляет запись исходной
+        картинки, но не её миниатюры.
+        """
+        removed = 0
+        for rows in self.kvstore_rows('thumbnails'):
+            lists = {add_prefix(del_prefix(key), 'image'): (key, value)
+                     for key, value in rows}
+            sources = {
+                key: json.loads(value)['name'] for key, value in
+                KVStore.objects.filter(key__in=lists)
+                .values_list('key', 'value')}
+            referenced = set(Post.objects.filter(image__in=sources.values())
+                             .values_list('image', flat=True))
+            orphans = [(source_key, lists[source_key])
+                       for source_key in lists
+                       if sources.get(source_key) not in referenced]
+            if not orphans:
+                continue
+            thumbnail_keys = [
+                add_prefix(key, 'image') for source_key, (_, value) in orphans
+                for key in json.loads(value)]
+            names = [
+                json.loads(value)['name'] for value in
+                KVStore.objects.filter(key__in=thumbnail_keys)
+                .values_list('value', flat=True)]
+            removed += len(names)
+            if self.dry_run:
+                continue
+            for name in names:
+                default.storage.delete(name)
+            forget_thumbnails(names)
+            stale = [key for source_key, (list_key, _) in orphans
+                     for key in (source_key, list_key)]
+            KVStore.objects.filter(key__in=stale).delete()
+            default.kvstore.cache.delete_many(stale)
+        return removed
+
+    def evict_thumbnails(self, max_bytes, max_idle):
+        """Удаляет давно не показывавшиеся миниатюры (LRU).
+
+        Время обращения записывают показ миниатюры в ленте и её отдача
+        (core.storage.touch_media); у миниатюр без записи это время
+        создания файла. Первый проход считает объём по часам последнего
+        обращения, второй удаляет всё старше найденной границы, поэтому
+        память не зависит от числа файлов.
+        """
+        directory = sorl_settings.THUMBNAIL_PREFIX
+        total = 0
+        by_hour = Counter()
+        for name, size, accessed, source in self.thumbnails(directory):
+            total += size
+            by_hour[accessed // ACCESS_BUCKET] += size
+        cutoff = self.now - max_idle if max_idle is not None else 0
+        if max_bytes is not None and total > max_bytes:
+            excess = total - max_bytes
+            for hour in sorted(by_hour):
+                cutoff = max(cutoff, (hour + 1) * ACCESS_BUCKET)
+                excess -= by_hour[hour]
+                if excess <= 0:
+                    break
+        # Только что открытые миниатюры видны в свежих фрагментах лент.
+        cutoff = min(cutoff, self.now - self.min_age)
+        stale = (
+            (name, size, source)
+            for name, size, accessed, source in self.thumbnails(directory)
+            if accessed < cutoff)
+        removed = freed = 0
+        for batch in batches(stale, self.chunk_size):
+            removed += len(batch)
+            freed += sum(size for name, size, source in batch)
+            if self.dry_run:
+                continue
+            names = [name for name, size, source in batch]
+            for name in names:
+                default.storage.delete(name)
+            forget_thumbnails(names)
+            # Страницы, показавшие миниатюру, ссылаются на удалённый файл.
+            sources = {source for name, size, source in batch if source}
+            posts = Post.objects.filter(image__in=sources).only(
+                'pk', 'author_id', 'group_id')
+            bump(*{name for post in posts for name in page_scopes(post)})
+        return removed, freed
+
+    def thumbnails(self, directory):
+        """Миниатюры: (имя, размер, время обращения, исходная картинка)."""
+        files = walk_files(default.storage, directory)
+        for batch in batches(files, self.chunk_size):
+            recorded = media_accessed([name for name, stat in batch])
+            for name, stat in batch:
+                accessed, source = recorded.get(name, (0, None))
+                yield (name, stat.st_size, max(accessed, stat.st_mtime),
+                       source)
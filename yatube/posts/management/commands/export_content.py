@@ -0,0 +1,38 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts.transfer import KINDS, dumps, export_records
+
+
+class Command(BaseCommand):
+    help = ('Выгружает группы, посты, комментарии и подписки в JSONL '
+            'потоком, не загружая таблицы в память.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл JSONL или - для stdout.')
+        parser.add_argument('--kinds', nargs='+', choices=KINDS,
+                            default=KINDS)
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        to_stdout = options['path'] == '-'
+        output = (sys.stdout if to_stdout
+                  else open(options['path'], 'w', encoding='utf-8'))
+        # При выводе в stdout ход выгрузки пишется в stderr.
+        progress = self.stderr if to_stdout else self.stdout
+        chunk_size = options['chunk_size']
+        try:
+            for kind in KINDS:
+                if kind not in options['kinds']:
+                    continue
+                written = 0
+                for record in export_records(kind, chunk_size):
+                    output.write(dumps(record) + '\n')
+                    written += 1
+                    if written % chunk_size == 0:
+                        progress.write(f'{kind}: {written}')
+                progress.write(f'{kind}: выгружено {written}')
+        finally:
+            if not to_stdout:
+                output.close()
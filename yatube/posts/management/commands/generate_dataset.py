@@ -0,0 +1,266 @@
+import datetime
+import random
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils.dateparse import parse_datetime
+
+from posts import dataset
+from posts.counters import change_media_refs
+from posts.feed import rebuild_timelines
+from posts.ingest import EXTENSIONS, process_image
+from posts.models import Comment, Follow, Group, Post, User, UserStats
+from posts.transfer import original_dates
+from posts.utils import batches
+
+
+class Command(BaseCommand):
+    help = ('Заполняет базу синтетическими пользователями, группами, '
+            'постами, комментариями и подписками для замеров. Активность '
+            'авторов и число подписчиков распределены по степенному '
+            'закону; одно и то же --seed даёт одну и ту же базу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--groups', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=100000)
+        parser.add_argument('--comments', type=int, default=300000,
+                            help='Примерное общее число комментариев.')
+        parser.add_argument('--follows', type=int, default=100000,
+                            help='Примерное общее число подписок.')
+        parser.add_argument('--images', type=int, default=0,
+                            help='Сколько разных картинок сгенерировать.')
+        parser.add_argument('--image-ratio', type=float, default=0.2,
+                            help='Доля постов с картинкой.')
+        parser.add_argument('--group-ratio', type=float, default=0.6,
+                            help='Доля постов в группах.')
+        parser.add_argument('--exponent', type=float, default=1.1,
+                            help='Показатель степенного закона.')
+        parser.add_argument('--days', type=int, default=365)
+        parser.add_argument('--until', default='2026-01-01T00:00:00+00:00',
+                            help='Дата последнего поста.')
+        parser.add_argument('--prefix', default='bench',
+                            help='Префикс имён пользователей и групп.')
+        parser.add_argument('--password', default='bench-password',
+                            help='Пароль всех созданных пользователей.')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--skip-timelines', action='store_true',
+                            help='Не собирать ленты подписок.')
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.prefix = options['prefix']
+        self.until = parse_datetime(options['until'])
+        if self.until is None:
+            raise CommandError('--until: ожидается дата ISO 8601.')
+        if (User.objects.filter(username__startswith=f'{self.prefix}-')
+                .exists() or Group.objects.filter(
+                    slug__startswith=f'{self.prefix}-').exists()):
+            raise CommandError(
+                f'Пользователи или группы {self.prefix}-* уже есть: '
+                'укажите другой --prefix.')
+        started = time.perf_counter()
+        from faker import Faker
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(options['seed'])
+        self.words = dataset.vocabulary(self.rng)
+        self.word_weights = dataset.power_law(len(self.words))
+        user_ids = self.create_users(options['users'])
+        # Популярность авторов и групп — случайная перестановка рангов.
+        self.authors = self.ranked(user_ids)
+        self.author_weights = dataset.power_law(len(user_ids),
+                                                options['exponent'])
+        self.groups = self.ranked(self.create_groups(options['groups']))
+        self.group_weights = dataset.power_law(len(self.groups),
+                                               options['exponent'])
+        self.images = self.create_images(options['images'])
+        self.stats = {field: Counter() for field in (
+            'posts_count', 'followers_count', 'following_count')}
+        self.create_follows(user_ids, options['follows'])
+        self.create_posts(options['posts'], options['comments'])
+        # Посты и комментарии вставлены со своими id.
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]):
+                cursor.execute(sql)
+        UserStats.objects.bulk_create(
+            (UserStats(user_id=user_id, **{
+                field: counts[user_id]
+                for field, counts in self.stats.items()})
+             for user_id in user_ids))
+        # Те же картинки могли остаться от прошлого запуска.
+        for name, refs in self.image_refs.items():
+            change_media_refs(name, refs)
+        if not options['skip_timelines']:
+            self.build_timelines()
+        # Созданные мимо сигналов данные не сбрасывают версии фрагментов.
+        cache.clear()
+        self.stdout.write(
+            f'Готово за {time.perf_counter() - started:.0f} с')
+
+    def ranked(self, ids):
+        ids = list(ids)
+        self.rng.shuffle(ids)
+        return ids
+
+    def insert(self, label, model, objects):
+        """bulk_create порциями, каждая в своей транзакции."""
+        created = 0
+        for batch in batches(objects, self.batch_size):
+            with transaction.atomic(), original_dates(model):
+                model.objects.bulk_create(batch)
+            created += len(batch)
+            self.stdout.write(f'{label}: {created}')
+
+    def create_users(self, total):
+        faker = self.faker
+        # Хеш один на всех: пароль известен нагрузочным тестам.
+        password = make_password(self.options['password'])
+        self.insert('Пользователей', User, (
+            User(username=f'{self.prefix}-{number}', password=password,
+                 first_name=faker.first_name(), last_name=faker.last_name(),
+                 date_joined=self.moment(0))
+            for number in range(total)))
+        return list(
+            User.objects.filter(username__startswith=f'{self.prefix}-')
+            .order_by('pk').values_list('pk', flat=True))
+
+    def create_groups(self, total):
+        self.insert('Групп', Group, (
+            Group(slug=f'{self.prefix}-{number}',
+                  title=self.faker.catch_phrase()[:200],
+                  created=self.moment(0),
+                  description=dataset.text(self.rng, self.words,
+                                           self.word_weights))
+            for number in range(total)))
+        return list(
+            Group.objects.filter(slug__startswith=f'{self.prefix}-')
+            .order_by('pk').values_list('pk', flat=True))
+
+    def create_images(self, total):
+        """Картинки проходят тот же приём, что и загруженные."""
+        field = Post._meta.get_field('image')
+        self.image_refs = Counter()
+        images = []
+        for number in range(total):
+            data, output_format, width, height, color = process_image(
+                dataset.sample_image(self.rng), settings.IMAGE_MAX_EDGE,
+                settings.IMAGE_MAX_PIXELS, settings.IMAGE_INGEST_FORMAT,
+                settings.IMAGE_INGEST_QUALITY)
+            name = field.storage.save(
+                f'{field.upload_to}{self.prefix}-{number}.'
+                f'{EXTENSIONS[output_format]}', ContentFile(data))
+            images.append({'image': name, 'image_width': width,
+                           'image_height': height, 'image_color': color})
+        self.stdout.write(f'Картинок: {len(images)}')
+        return images
+
+    def create_follows(self, user_ids, total):
+        """Подписки со скошенным распределением.
+
+        Число подписок у читателя — экспоненциальное, а авторы
+        выбираются по популярности, поэтому у немногих авторов
+        подписчиков на порядки больше, чем у остальных.
+        """
+        rng = self.rng
+        mean = total / max(len(user_ids), 1)
+
+        def follows():
+            for user_id in user_ids:
+                wanted = min(self.around(mean), len(user_ids) - 1)
+                authors = set()
+                for _ in range(wanted * 3):
+                    if len(authors) >= wanted:
+                        break
+                    author_id = rng.choices(
+                        self.authors, cum_weights=self.author_weights)[0]
+                    if author_id != user_id:
+                        authors.add(author_id)
+                for author_id in sorted(authors):
+                    self.stats['following_count'][user_id] += 1
+                    self.stats['followers_count'][author_id] += 1
+                    yield Follow(user_id=user_id, author_id=author_id,
+                                 created=self.moment(rng.random()))
+
+        self.insert('Подписок', Follow, follows())
+
+    def around(self, mean):
+        """Целое из экспоненциального распределения со средним mean."""
+        return round(self.rng.expovariate(1 / mean)) if mean else 0
+
+    def moment(self, share):
+        """Дата в окне --days, share от 0 (начало) до 1 (конец)."""
+        return self.until - datetime.timedelta(
+            days=self.options['days'] * (1 - share))
+
+    def create_posts(self, total, comments_total):
+        """Посты и их комментарии одной транзакцией на порцию постов."""
+        rng = self.rng
+        post_pk = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        comment_pk = (
+            Comment.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+        mean_comments = comments_total / max(total, 1)
+        comments_created = 0
+        for offset in range(0, total, self.batch_size):
+            posts, comments = [], []
+            for number in range(offset, min(offset + self.batch_size, total)):
+                # id растут вместе с датой, как у настоящих постов.
+                pub_date = self.moment((number + rng.random()) / total)
+                author_id = rng.choices(
+                    self.authors, cum_weights=self.author_weights)[0]
+                self.stats['posts_count'][author_id] += 1
+                group_id = None
+                if self.groups and rng.random() < self.options[
+                        'group_ratio']:
+                    group_id = rng.choices(
+                        self.groups, cum_weights=self.group_weights)[0]
+                image = {}
+                if self.images and rng.random() < self.options[
+                        'image_ratio']:
+                    image = rng.choice(self.images)
+                    self.image_refs[image['image']] += 1
+                count = self.around(mean_comments)
+                for _ in range(count):
+                    comments.append(Comment(
+                        pk=comment_pk, post_id=post_pk,
+                        author_id=rng.choice(self.authors),
+                        text=dataset.text(rng, self.words,
+                                          self.word_weights, 3, 30),
+                        created=pub_date + datetime.timedelta(
+                            minutes=rng.expovariate(1 / 600))))
+                    comment_pk += 1
+                posts.append(Post(
+                    pk=post_pk, author_id=author_id, group_id=group_id,
+                    text=dataset.text(rng, self.words, self.word_weights),
+                    pub_date=pub_date, created=pub_date,
+                    comments_count=count, **image))
+                post_pk += 1
+            with transaction.atomic(), original_dates(Post, Comment):
+                Post.objects.bulk_create(posts)
+                Comment.objects.bulk_create(comments)
+            comments_created += len(comments)
+            self.stdout.write(f'Постов: {offset + len(posts)}, '
+                              f'комментариев: {comments_created}')
+
+    def build_timelines(self):
+        followers = (Follow.objects.filter(
+            user__username__startswith=f'{self.prefix}-')
+            .order_by('user_id').values_list('user_id', flat=True)
+            .distinct())
+        built = 0
+        for user_ids in batches(followers.iterator(), 500):
+            with transaction.atomic():
+                rebuild_timelines(user_ids)
+            built += len(user_ids)
+            self.stdout.write(f'Лент подписок: {built}')
@@ -0,0 +1,84 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+
+from posts.models import Comment, Post
+from posts.transfer import LOADERS, TransferError
+
+
+class Command(BaseCommand):
+    help = ('Загружает JSONL из export_content порциями через '
+            'bulk_create. После каждой порции позиция в файле '
+            'сохраняется, и прерванная загрузка продолжается с неё.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл с позицией загрузки (по умолчанию path.checkpoint).')
+        parser.add_argument('--restart', action='store_true',
+                            help='Начать с начала файла.')
+
+    def handle(self, *args, **options):
+        self.checkpoint = (options['checkpoint']
+                           or options['path'] + '.checkpoint')
+        position = {'offset': 0, 'line': 0, 'created': 0}
+        if not options['restart'] and os.path.exists(self.checkpoint):
+            with open(self.checkpoint) as checkpoint:
+                position = json.load(checkpoint)
+            self.stdout.write(f'Продолжение со строки {position["line"]}')
+        batch_size = options['batch_size']
+        kind, batch = None, []
+        offset, line_number = position['offset'], position['line']
+        # Файл читается в байтах, чтобы позиция была смещением в нём.
+        with open(options['path'], 'rb') as source:
+            source.seek(offset)
+            for line in source:
+                if line.strip():
+                    try:
+                        record = json.loads(line)
+                    except ValueError as error:
+                        raise CommandError(
+                            f'Строка {line_number + 1}: {error}')
+                    if batch and (record.get('type') != kind
+                                  or len(batch) >= batch_size):
+                        self.flush(kind, batch, position, offset,
+                                   line_number)
+                        batch = []
+                    kind = record.get('type')
+                    if kind not in LOADERS:
+                        raise CommandError(
+                            f'Строка {line_number + 1}: тип {kind!r}')
+                    batch.append(record)
+                offset += len(line)
+                line_number += 1
+        if batch:
+            self.flush(kind, batch, position, offset, line_number)
+        # Посты и комментарии вставлены со своими id.
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(
+                    no_style(), [Post, Comment]):
+                cursor.execute(sql)
+        self.stdout.write(f'Готово: добавлено {position["created"]}')
+
+    def flush(self, kind, batch, position, offset, line_number):
+        try:
+            with transaction.atomic():
+                created = LOADERS[kind](batch)
+        except (TransferError, KeyError) as error:
+            raise CommandError(
+                f'Порция до строки {line_number}: {error!r}')
+        position.update(offset=offset, line=line_number,
+                        created=position['created'] + created)
+        # Позиция пишется после коммита; повтор порции безопасен.
+        temporary = self.checkpoint + '.tmp'
+        with open(temporary, 'w') as checkpoint:
+            json.dump(position, checkpoint)
+        os.replace(temporary, self.checkpoint)
+        self.stdout.write(
+            f'Строка {line_number}: {kind} +{created}, '
+            f'всего {position["created"]}')
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_comments_count, reconcile_user_stats
+
+
+class Command(BaseCommand):
+    help = ('Сверяет денормализованные счётчики с данными '
+            'и исправляет расхождения порциями.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        for title, reconcile in (
+            ('Пользователи', reconcile_user_stats),
+            ('Посты', reconcile_comments_count),
+        ):
+            checked = fixed = 0
+            for chunk_checked, chunk_fixed in reconcile(chunk_size):
+                checked += chunk_checked
+                fixed += chunk_fixed
+                self.stdout.write(
+                    f'{title}: проверено {checked}, исправлено {fixed}')
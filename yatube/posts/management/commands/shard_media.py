@@ -0,0 +1,74 @@
+import time
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts.counters import change_media_refs, chunks
+from posts.models import Post
+from posts.versions import bump, scope
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов в каталоги по хешу содержимого '
+            'и переписывает Post.image порциями. Прерванный перенос '
+            'продолжается повторным запуском.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--pause', type=float, default=0,
+                            help='Пауза между порциями, секунды.')
+        parser.add_argument('--after', type=int, default=0,
+                            help='Начать с постов с id больше этого.')
+
+    def handle(self, *args, **options):
+        storage = Post._meta.get_field('image').storage
+        moved = missing = 0
+        # Уже перенесённые файлы пропускаются, так что прерванный перенос
+        # можно запустить снова; --after пропускает пройденные посты.
+        legacy = Post.objects.exclude(image='').filter(pk__gt=options['after'])
+        for post_ids in chunks(legacy, options['batch_size']):
+            names = dict(
+                Post.objects.filter(pk__in=post_ids).order_by()
+                .values_list('image').annotate(total=Count('pk')))
+            for name, total in names.items():
+                if storage.is_sharded(name):
+                    continue
+                if not self.exists(storage, name):
+                    missing += total
+                    continue
+                moved += self.move(storage, name, post_ids)
+            self.stdout.write(
+                f'До поста {post_ids[-1]}: перенесено {moved}, '
+                f'файлов нет у {missing} постов')
+            time.sleep(options['pause'])
+
+    @staticmethod
+    def exists(storage, name):
+        try:
+            return storage.exists(name)
+        except SuspiciousFileOperation:
+            return False
+
+    @staticmethod
+    def move(storage, name, post_ids):
+        # Копия по хешу появляется раньше, чем на неё переключаются посты,
+        # а старый файл удаляется после коммита, когда на него не осталось
+        # ссылок, поэтому страницы не видят пропавших картинок.
+        with storage.open(name) as source:
+            new_name = storage.save(name, source)
+        with transaction.atomic():
+            moved_ids = list(Post.objects.filter(
+                pk__in=post_ids, image=name).values_list('pk', flat=True))
+            updated = Post.objects.filter(
+                pk__in=moved_ids).update(image=new_name)
+            if updated:
+                # update() минует сигналы, а страницы постов ссылаются
+                # на сам файл.
+                bump(*(scope('post', pk) for pk in moved_ids))
+                change_media_refs(new_name, updated)
+                # Миниатюры старого файла остаются: на них ссылаются
+                # закэшированные фрагменты лент.
+                change_media_refs(name, -updated, delete_thumbnails=False)
+        return updated
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from posts.feed import overfull_timelines, trim_timelines
+
+
+class Command(BaseCommand):
+    help = ('Удаляет из лент подписок записи сверх '
+            'FOLLOW_TIMELINE_LENGTH. Запускается по расписанию: при '
+            'записи поста ленты не обрезаются.')
+
+    def handle(self, *args, **options):
+        user_ids = list(overfull_timelines())
+        trim_timelines(user_ids)
+        self.stdout.write(f'Обрезано лент: {len(user_ids)}')
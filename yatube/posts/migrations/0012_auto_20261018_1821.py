@@ -0,0 +1,42 @@
+# Generated by Django 2.2.16 on 2026-10-18 18:21
+
+import core.storage
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_media_refs(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    MediaFile = apps.get_model('posts', 'MediaFile')
+    refs = (Post.objects.exclude(image='').order_by()
+            .values_list('image').annotate(total=Count('pk')))
+    MediaFile.objects.bulk_create((
+        MediaFile(name=name, refs=total) for name, total in refs.iterator()
+    ), batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_post_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('refs', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+        ),
+        # Хранилище не влияет на схему, а AlterField в SQLite пересоздал
+        # бы таблицу posts_post вместе с триггерами полнотекстового индекса.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name='post',
+                name='image',
+                field=models.ImageField(blank=True, storage=core.storage.ContentAddressedStorage(), upload_to='posts/', verbose_name='Картинка'),
+            ),
+        ]),
+        migrations.RunPython(fill_media_refs, migrations.RunPython.noop),
+    ]
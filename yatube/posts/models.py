@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from core.models import CreatedModel
+from core.storage import ContentAddressedStorage
 
 User = get_user_model()
 
@@ -33,15 +34,32 @@ class Post(CreatedModel):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        blank=True,
+        storage=ContentAddressedStorage()
     )
     # Аргумент upload_to указывает директорию,
     # в которую будут загружаться пользовательские файлы.
+    # Размер и средний цвет картинки сохраняются при загрузке, чтобы
+    # шаблоны и sorl-thumbnail не открывали файл при выводе ленты.
+    image_width = models.PositiveIntegerField(null=True, editable=False)
+    image_height = models.PositiveIntegerField(null=True, editable=False)
+    image_color = models.CharField(max_length=7, blank=True, editable=False)
+    comments_count = models.PositiveIntegerField(
+        'Число комментариев', default=0, editable=False)
 
     class Meta:
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Индексы повторяют порядок лент: (фильтр, -pub_date, -id).
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='post_pub_date_idx'),
+            models.Index(fields=('author', '-pub_date', '-id'),
+                         name='post_author_pub_date_idx'),
+            models.Index(fields=('group', '-pub_date', '-id'),
+                         name='post_group_pub_date_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -54,9 +72,63 @@ class Comment(CreatedModel):
                                related_name='comments')
     text = models.TextField('Текст', help_text='Текст нового комментария')
 
+    class Meta:
+        ordering = ('created',)
+        indexes = [
+            models.Index(fields=('post', 'created'),
+                         name='comment_post_created_idx'),
+        ]
+
 
 class Follow(CreatedModel):
     user = models.ForeignKey(User, on_delete=models.CASCADE,
                              related_name='follower')
     author = models.ForeignKey(User, on_delete=models.CASCADE,
                                related_name='following')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'author'),
+                                    name='unique_follow'),
+        ]
+
+
+class UserStats(models.Model):
+    """Счётчики пользователя, обновляемые при записи."""
+    user = models.OneToOneField(User, on_delete=models.CASCADE,
+                                primary_key=True, related_name='stats')
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField('Число подписчиков',
+                                                  default=0)
+    following_count = models.PositiveIntegerField('Число подписок',
+                                                  default=0)
+
+
+class Timeline(models.Model):
+    """Материализованная лента подписок: пост, доставленный подписчику."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE,
+                             related_name='timeline')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE,
+                             related_name='timeline_entries')
+    # Копия Post.pub_date, чтобы лента читалась одним проходом по индексу.
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=('user', 'post'),
+                                    name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-post'),
+                         name='timeline_user_pub_date_idx'),
+        ]
+
+
+class MediaFile(models.Model):
+    """Число постов, которые ссылаются на файл картинки.
+
+    Одинаковые картинки хранятся одним файлом (ContentAddressedStorage),
+    и файл удаляется, когда счётчик доходит до нуля.
+    """
+    name = models.CharField('Имя файла', max_length=100, primary_key=True)
+    refs = models.PositiveIntegerField('Число ссылок', default=0)
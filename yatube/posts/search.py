@@ -0,0 +1,122 @@
+"""Полнотекстовый поиск по постам через SQLite FTS5.
+
+Таблица posts_post_fts (см. миграцию 0011) индексирует Post.text.
+Результаты упорядочены по bm25 и листаются курсором по (ранг, id),
+поэтому глубокие страницы выдачи не требуют OFFSET. Ранжируются только
+rank_window самых свежих совпадений: для частых слов bm25 по всем
+совпадениям стоит сотни миллисекунд.
+"""
+import unicodedata
+
+from django.core.paginator import Paginator
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from core.paginator import NEXT, PREVIOUS, decode_cursor, encode_cursor
+from .models import Post
+from .utils import for_listing
+
+# Маркеры подсветки из области Unicode для частного использования:
+# в тексте поста их нет, и они переживают экранирование HTML.
+MARK_START = '\ue000'
+MARK_END = '\ue001'
+
+
+def fts_query(text):
+    """Превращает ввод пользователя в запрос FTS5: все слова по префиксу."""
+    # Управляющие символы (например, NUL) SQLite считает концом строки
+    # запроса, поэтому они разделяют слова, как пробелы.
+    text = ''.join(
+        ' ' if unicodedata.category(char) == 'Cc' else char for char in text)
+    terms = [term.replace('"', '""') for term in text.split()]
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def matching_ids_sql():
+    """Подзапрос id постов, подходящих под запрос FTS5 (параметр %s)."""
+    return 'SELECT rowid FROM posts_post_fts WHERE posts_post_fts MATCH %s'
+
+
+def _search(match, direction, rank, pk, limit, rank_window=None):
+    sql = [
+        'SELECT rowid, bm25(posts_post_fts), '
+        "highlight(posts_post_fts, 0, %s, %s) "
+        'FROM posts_post_fts WHERE posts_post_fts MATCH %s'
+    ]
+    params = [MARK_START, MARK_END, match]
+    if rank_window:
+        # Нижняя граница rowid для rank_window последних совпадений;
+        # FTS5 читает список документов с конца и не считает bm25.
+        sql.append(
+            'AND rowid >= COALESCE((SELECT rowid FROM posts_post_fts '
+            'WHERE posts_post_fts MATCH %s ORDER BY rowid DESC '
+            'LIMIT 1 OFFSET %s), 0)')
+        params.extend([match, rank_window - 1])
+    if rank is not None:
+        operator = '>' if direction == NEXT else '<'
+        sql.append(f'AND (bm25(posts_post_fts), rowid) {operator} (%s, %s)')
+        params.extend([rank, pk])
+    order = 'ASC' if direction == NEXT else 'DESC'
+    sql.append(f'ORDER BY bm25(posts_post_fts) {order}, rowid {order} '
+               'LIMIT %s')
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(' '.join(sql), params)
+        return cursor.fetchall()
+
+
+def _highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+class SearchPaginator(Paginator):
+    """Курсорная выдача поиска; страницы по номеру не поддерживаются."""
+
+    def __init__(self, text, per_page, rank_window=None, **kwargs):
+        self.match = fts_query(text)
+        self.rank_window = rank_window
+        super().__init__(Post.objects.none(), per_page, **kwargs)
+
+    def get_cursor_page(self, token):
+        cursor = decode_cursor(token, parse_value=float) if token else None
+        direction, rank, pk = cursor or (NEXT, None, None)
+        rows = []
+        if self.match:
+            rows = _search(self.match, direction, rank, pk,
+                           self.per_page + 1, self.rank_window)
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if direction == PREVIOUS:
+            rows.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = rank is not None, has_more
+        if not rows and rank is not None:
+            return self.get_cursor_page(None)
+        posts = for_listing(Post.objects.all()).in_bulk(
+            [row[0] for row in rows])
+        items = []
+        for post_id, post_rank, snippet in rows:
+            post = posts.get(post_id)
+            if post is None:
+                continue
+            post.rank = post_rank
+            post.highlighted = _highlight(snippet)
+            items.append(post)
+        number = 2 if has_previous else 1
+        self.num_pages = number + 1 if has_next else number
+        page = self._get_page(items, number, self)
+        page.is_cursor = True
+        page.next_cursor = page.previous_cursor = None
+        if rows and has_next:
+            page.next_cursor = encode_cursor(NEXT, repr(rows[-1][1]),
+                                             rows[-1][0])
+        if rows and has_previous:
+            page.previous_cursor = encode_cursor(PREVIOUS, repr(rows[0][1]),
+                                                 rows[0][0])
+        return page
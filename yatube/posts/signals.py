@@ -0,0 +1,138 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feed, ingest, versions
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+@receiver(post_save, sender=User)
+def create_user_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.get_or_create(user=instance)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_stats(instance.author_id, posts_count=1)
+        feed.fan_out_post(instance)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, posts_count=-1)
+    if instance.image:
+        counters.change_media_refs(instance.image.name, -1)
+
+
+@receiver(post_save, sender=Post)
+def count_image_refs(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous_image', '')
+    current = instance.image.name or ''
+    if current == previous:
+        return
+    if current:
+        counters.change_media_refs(current, 1)
+    if previous:
+        counters.change_media_refs(previous, -1)
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created:
+        counters.change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    counters.change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_followed_author(sender, instance, created, **kwargs):
+    if created:
+        counters.change_user_stats(instance.author_id, followers_count=1)
+        counters.change_user_stats(instance.user_id, following_count=1)
+        feed.backfill_author(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def remove_unfollowed_author(sender, instance, **kwargs):
+    counters.change_user_stats(instance.author_id, followers_count=-1)
+    counters.change_user_stats(instance.user_id, following_count=-1)
+    feed.remove_author(instance.user_id, instance.author_id)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous_state(sender, instance, **kwargs):
+    if instance.pk is not None:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'image').first()
+        if previous is not None:
+            instance._previous_group_ids = {previous[0]}
+            instance._previous_image = previous[1]
+
+
+@receiver(pre_save, sender=Post)
+def fill_image_metadata(sender, instance, raw=False, **kwargs):
+    image = instance.image
+    if raw:
+        return
+    if not image:
+        instance.image_width = instance.image_height = None
+        instance.image_color = ''
+        return
+    metadata = None
+    if not image._committed:
+        # Картинка из PostForm уже измерена при приёме (ingest.ingest).
+        metadata = getattr(image.file, 'metadata', None)
+    elif image.name == getattr(instance, '_previous_image', None):
+        return
+    if metadata is None:
+        metadata = ingest.read_metadata(image)
+    for field, value in metadata.items():
+        setattr(instance, field, value)
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def bump_post_versions(sender, instance, **kwargs):
+    versions.bump_post(
+        instance, getattr(instance, '_previous_group_ids', ()))
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def bump_comment_versions(sender, instance, **kwargs):
+    versions.bump(versions.scope('post', instance.post_id))
+
+
+@receiver(post_save, sender=Follow)
+@receiver(post_delete, sender=Follow)
+def bump_follow_versions(sender, instance, **kwargs):
+    # Посты автора не изменились: сбрасываются только его счётчики,
+    # а не ленты и фрагменты из области author.
+    versions.bump(versions.scope('feed', instance.user_id),
+                  versions.scope('author-stats', instance.author_id),
+                  versions.scope('author-stats', instance.user_id))
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def bump_group_versions(sender, instance, **kwargs):
+    versions.bump(versions.scope('group', instance.pk),
+                  versions.scope('index'))
+
+
+@receiver(post_save, sender=User)
+def bump_author_versions(sender, instance, created, update_fields=None,
+                         **kwargs):
+    # Вход в систему сохраняет только last_login, а у нового
+    # пользователя ещё нет постов.
+    if created or update_fields and set(update_fields) == {'last_login'}:
+        return
+    group_ids = Post.objects.filter(author=instance).exclude(
+        group=None).values_list('group_id', flat=True).distinct()
+    versions.bump(versions.scope('author', instance.pk),
+                  versions.scope('index'),
+                  *(versions.scope('group', pk) for pk in group_ids))
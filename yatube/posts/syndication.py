@@ -0,0 +1,204 @@
+"""Ленты RSS, Atom и JSON Feed для главной, групп и авторов.
+
+Лента берёт те же querysets, что и страницы, и выбирает окно из
+FEED_POSTS_COUNT постов по курсору (?cursor=, ссылка rel="next"), без
+OFFSET и COUNT(*). Ответ пишется потоком по одному посту и целиком
+кладётся в кэш под версией области (как фрагменты страниц), поэтому
+опрос ленты без новых постов стоит одного обращения к кэшу, а при
+совпадении ETag — ответа 304 без тела.
+"""
+import hashlib
+import io
+import json
+from calendar import timegm
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.feedgenerator import (Atom1Feed, Rss201rev2Feed,
+                                        SyndicationFeed)
+from django.utils.http import http_date, quote_etag
+from django.utils.text import Truncator
+from django.utils.xmlutils import SimplerXMLGenerator
+
+from core.paginator import CursorPaginator
+
+from .versions import versions
+
+
+class StreamingFeedMixin:
+    """Пишет XML-ленту кусками: заголовок, каждый пост, окончание."""
+
+    item_element = None
+    link_element = None
+
+    def stream(self, encoding='utf-8'):
+        buffer = io.StringIO()
+        handler = SimplerXMLGenerator(buffer, encoding)
+
+        def flush():
+            chunk = buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            return chunk
+
+        handler.startDocument()
+        self.start(handler)
+        yield flush()
+        for item in self.items:
+            handler.startElement(self.item_element,
+                                 self.item_attributes(item))
+            self.add_item_elements(handler, item)
+            handler.endElement(self.item_element)
+            yield flush()
+        self.end(handler)
+        yield flush()
+
+    def add_root_elements(self, handler):
+        super().add_root_elements(handler)
+        if self.feed.get('next_url'):
+            # Следующее окно ленты по RFC 5005.
+            handler.addQuickElement(self.link_element, None, {
+                'rel': 'next', 'href': self.feed['next_url']})
+
+
+class RssFeed(StreamingFeedMixin, Rss201rev2Feed):
+    item_element = 'item'
+    link_element = 'atom:link'
+
+    def start(self, handler):
+        handler.startElement('rss', self.rss_attributes())
+        handler.startElement('channel', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end(self, handler):
+        self.endChannelElement(handler)
+        handler.endElement('rss')
+
+
+class AtomFeed(StreamingFeedMixin, Atom1Feed):
+    item_element = 'entry'
+    link_element = 'link'
+
+    def start(self, handler):
+        handler.startElement('feed', self.root_attributes())
+        self.add_root_elements(handler)
+
+    def end(self, handler):
+        handler.endElement('feed')
+
+
+class JsonFeed(SyndicationFeed):
+    """JSON Feed 1.1 (https://jsonfeed.org/version/1.1)."""
+
+    content_type = 'application/feed+json; charset=utf-8'
+
+    def stream(self, encoding='utf-8'):
+        header = {
+            'version': 'https://jsonfeed.org/version/1.1',
+            'title': self.feed['title'],
+            'home_page_url': self.feed['link'],
+            'feed_url': self.feed['feed_url'],
+            'description': self.feed['description'],
+            'language': self.feed['language'],
+        }
+        if self.feed.get('next_url'):
+            header['next_url'] = self.feed['next_url']
+        yield self.dumps(header)[:-1] + ', "items": ['
+        for number, item in enumerate(self.items):
+            yield (', ' if number else '') + self.dumps({
+                'id': item['unique_id'] or item['link'],
+                'url': item['link'],
+                'title': item['title'],
+                'content_text': item['description'],
+                'date_published': item['pubdate'],
+                'authors': [{'name': item['author_name']}],
+                'tags': item['categories'],
+            })
+        yield ']}'
+
+    @staticmethod
+    def dumps(value):
+        return json.dumps(value, cls=DjangoJSONEncoder, ensure_ascii=False)
+
+
+FORMATS = {'rss': RssFeed, 'atom': AtomFeed, 'json': JsonFeed}
+
+
+def feed_window(queryset, token):
+    """Посты окна ленты после позиции курсора и курсор следующего окна."""
+    paginator = CursorPaginator(queryset, settings.FEED_POSTS_COUNT)
+    return paginator.next_window(token)
+
+
+def build_feed(request, feed_class, posts, next_cursor, title, link,
+               description):
+    feed_url = request.build_absolute_uri(request.path)
+    feed = feed_class(
+        title=title,
+        link=request.build_absolute_uri(link),
+        description=description,
+        language=settings.LANGUAGE_CODE,
+        feed_url=feed_url,
+        next_url=next_cursor and f'{feed_url}?cursor={next_cursor}',
+    )
+    for post in posts:
+        post_url = request.build_absolute_uri(
+            reverse('posts:post_detail', args=[post.pk]))
+        feed.add_item(
+            title=Truncator(post.text).words(8),
+            link=post_url,
+            unique_id=post_url,
+            description=post.text,
+            author_name=post.author.get_full_name() or post.author.username,
+            pubdate=post.pub_date,
+            categories=[post.group.title] if post.group_id else (),
+        )
+    return feed
+
+
+def _cached_stream(key, chunks, last_modified):
+    body = []
+    for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    # Лента попадает в кэш, только если её дочитали до конца.
+    cache.set(key, (last_modified, ''.join(body)),
+              settings.FRAGMENT_CACHE_TIMEOUT)
+
+
+def feed_response(request, fmt, queryset, scope, title, link, description):
+    """Ответ с лентой в формате fmt для постов queryset из области scope."""
+    feed_class = FORMATS.get(fmt)
+    if feed_class is None:
+        raise Http404
+    token = request.GET.get('cursor', '')
+    digest = hashlib.md5('|'.join([
+        fmt, versions(scope), token, request.get_host(),
+    ]).encode()).hexdigest()
+    key = f'feed:{digest}'
+    etag = quote_etag(digest)
+    cached = cache.get(key)
+    last_modified = cached[0] if cached else None
+    response = get_conditional_response(request, etag=etag,
+                                        last_modified=last_modified)
+    if response is None and cached:
+        response = HttpResponse(cached[1],
+                                content_type=feed_class.content_type)
+    elif response is None:
+        posts, next_cursor = feed_window(queryset, token)
+        if posts:
+            last_modified = timegm(posts[0].pub_date.utctimetuple())
+        feed = build_feed(request, feed_class, posts, next_cursor, title,
+                          link, description)
+        response = StreamingHttpResponse(
+            _cached_stream(key, feed.stream(), last_modified),
+            content_type=feed_class.content_type)
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, no_cache=True)
+    return response
@@ -0,0 +1,20 @@
+from django import template
+
+from posts.thumbnails import prefetch_thumbnails, responsive_thumbnail
+
+register = template.Library()
+
+
+@register.simple_tag
+def responsive_post_thumbnail(post):
+    """{% responsive_post_thumbnail post as im %}: im.src — основная
+    миниатюра, im.srcset — все готовые размеры; None, пока их нет."""
+    return responsive_thumbnail(post)
+
+
+@register.simple_tag
+def prefetch_post_thumbnails(posts):
+    """{% prefetch_post_thumbnails page_obj %}: находит миниатюры всей
+    страницы разом до цикла по постам."""
+    prefetch_thumbnails(posts)
+    return ''
@@ -0,0 +1,55 @@
+import io
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from posts.counters import reconcile_comments_count, reconcile_user_stats
+from posts.models import Comment, Follow, Group, Post, Timeline
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class GenerateDatasetTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def generate(self, **options):
+        call_command('generate_dataset', users=30, groups=3, posts=60,
+                     comments=120, follows=90, images=2, batch_size=25,
+                     stdout=io.StringIO(), **options)
+
+    @staticmethod
+    def fingerprint():
+        return list(Post.objects.order_by('pk').values_list(
+            'author__username', 'group__slug', 'text', 'pub_date',
+            'image', 'comments_count'))
+
+    def test_same_seed_same_data(self):
+        self.generate()
+        first = self.fingerprint()
+        User.objects.filter(username__startswith='bench-').delete()
+        Group.objects.filter(slug__startswith='bench-').delete()
+        self.generate()
+        self.assertEqual(self.fingerprint(), first)
+
+    def test_counters_and_timelines_consistent(self):
+        self.generate()
+        self.assertEqual(Post.objects.count(), 60)
+        self.assertTrue(Comment.objects.exists())
+        self.assertTrue(Post.objects.exclude(image='').exists())
+        for reconcile in (reconcile_user_stats, reconcile_comments_count):
+            self.assertEqual(sum(fixed for _, fixed in reconcile()), 0)
+        follow = Follow.objects.first()
+        self.assertEqual(
+            Timeline.objects.filter(user_id=follow.user_id).count(),
+            Post.objects.filter(author__following__user_id=follow.user_id)
+            .count())
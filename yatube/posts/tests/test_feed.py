@@ -0,0 +1,120 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.feed import trim_timelines
+from posts.models import Follow, Post, Timeline
+
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(username='reader')
+        cls.author = User.objects.create(username='author')
+        cls.other = User.objects.create(username='other')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def feed_texts(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return [post.text for post in response.context['page_obj']]
+
+    def test_new_post_is_pushed_to_followers(self):
+        """Новый пост сразу попадает в ленту подписчика."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Новый пост')
+        Post.objects.create(author=self.other, text='Чужой пост')
+        self.assertEqual(self.feed_texts(), ['Новый пост'])
+        self.assertEqual(Timeline.objects.filter(user=self.reader).count(), 1)
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        """Подписка подтягивает старые посты, отписка их убирает."""
+        Post.objects.create(author=self.author, text='Старый пост')
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': 'author'}))
+        self.assertEqual(self.feed_texts(), ['Старый пост'])
+        self.client.get(reverse('posts:profile_unfollow',
+                                kwargs={'username': 'author'}))
+        self.assertEqual(self.feed_texts(), [])
+        self.assertFalse(Timeline.objects.exists())
+
+    @override_settings(FOLLOW_TIMELINE_LENGTH=3)
+    def test_timeline_is_capped(self):
+        """trim_timelines оставляет в ленте FOLLOW_TIMELINE_LENGTH записей."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(author=self.author, text=str(i))
+                 for i in range(5)]
+        entries = Timeline.objects.filter(user=self.reader)
+        # Запись поста ленты не обрезает, это делает команда.
+        self.assertEqual(entries.count(), 5)
+        call_command('trim_timelines', stdout=StringIO())
+        self.assertEqual(
+            set(entries.values_list('post_id', flat=True)),
+            {post.pk for post in posts[-3:]})
+
+    @override_settings(FOLLOW_TIMELINE_LENGTH=2)
+    def test_trim_timelines_in_one_statement(self):
+        """Лишние записи всех лент удаляются одним запросом."""
+        posts = [Post.objects.create(author=self.author, text=str(i))
+                 for i in range(4)]
+        Timeline.objects.bulk_create(
+            Timeline(user=user, post=post, pub_date=post.pub_date)
+            for user in (self.reader, self.other) for post in posts)
+        with self.assertNumQueries(1):
+            trim_timelines([self.reader.pk, self.other.pk])
+        for user in (self.reader, self.other):
+            with self.subTest(user=user.username):
+                self.assertEqual(
+                    set(Timeline.objects.filter(user=user)
+                        .values_list('post_id', flat=True)),
+                    {post.pk for post in posts[-2:]})
+
+    def test_rebuild_timeline_command(self):
+        """Команда rebuild_timeline восстанавливает ленту."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(author=self.author, text='Пост')
+        Timeline.objects.all().delete()
+        call_command('rebuild_timeline', 'reader', stdout=StringIO())
+        self.assertEqual(self.feed_texts(), ['Пост'])
+
+
+@override_settings(FEED_PULL_THRESHOLD=2, POSTS_COUNT=3)
+class HybridFeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create(username='reader')
+        cls.fan = User.objects.create(username='fan')
+        cls.star = User.objects.create(username='star')
+        cls.author = User.objects.create(username='author')
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        Follow.objects.create(user=cls.fan, author=cls.star)
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_popular_author_is_pulled_and_merged(self):
+        """Посты популярного автора не раскладываются, но видны в ленте."""
+        posts = [
+            Post.objects.create(author=author, text=f'{author.username} {i}')
+            for i, author in enumerate(
+                [self.star, self.author, self.star, self.author, self.star])
+        ]
+        self.assertFalse(
+            Timeline.objects.filter(post__author=self.star).exists())
+        url = reverse('posts:follow_index')
+        first_page = self.client.get(url).context['page_obj']
+        response = self.client.get(url, {'cursor': first_page.next_cursor})
+        second_page = response.context['page_obj']
+        self.assertEqual(list(first_page) + list(second_page),
+                         posts[::-1])
+        self.assertFalse(second_page.has_next())
@@ -14,7 +14,7 @@ from django.urls import reverse
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostFormTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -85,7 +85,7 @@ class PostFormTests(TestCase):
                 text='Тест-текст',
                 author=self.post.author,
                 group=self.group.pk,
-                image='posts/small.gif'
+                image__regex=r'^posts/\w\w/\w\w/[0-9a-f]{64}\.jpg$'
             ).exists()
         )
 
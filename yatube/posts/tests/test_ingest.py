@@ -0,0 +1,41 @@
+import io
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from posts.ingest import ingest
+
+
+def upload(name, image, image_format, **save_options):
+    buffer = io.BytesIO()
+    image.save(buffer, image_format, **save_options)
+    return SimpleUploadedFile(name, buffer.getvalue())
+
+
+@override_settings(IMAGE_MAX_EDGE=100, IMAGE_MAX_PIXELS=1_000_000,
+                   IMAGE_INGEST_FORMAT='JPEG', IMAGE_INGEST_WORKERS=0)
+class IngestTests(TestCase):
+    def test_downsizes_and_strips_exif(self):
+        """Картинка уменьшается, поворачивается по EXIF и теряет EXIF."""
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Orientation: повернуть на 90°
+        exif[0x010F] = 'Phone'  # Make
+        uploaded = upload('photo.jpeg', Image.new('RGB', (400, 200)),
+                          'JPEG', exif=exif)
+        result = Image.open(ingest(uploaded))
+        self.assertEqual(result.size, (50, 100))
+        self.assertEqual(result.format, 'JPEG')
+        self.assertNotIn('exif', result.info)
+
+    def test_keeps_transparency(self):
+        uploaded = upload('logo.png', Image.new('RGBA', (10, 10)), 'PNG')
+        self.assertEqual(ingest(uploaded).name, 'logo.png')
+
+    @override_settings(IMAGE_INGEST_WORKERS=1)
+    def test_rejects_oversized_in_pool(self):
+        """Слишком большая картинка отклоняется и из пула процессов."""
+        uploaded = upload('huge.png', Image.new('L', (2000, 1000)), 'PNG')
+        with self.assertRaises(ValidationError):
+            ingest(uploaded)
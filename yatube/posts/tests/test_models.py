@@ -1,7 +1,11 @@
 from django.contrib.auth import get_user_model
+from django.db import IntegrityError, connection
 from django.test import TestCase
+from django.utils import timezone
 
-from ..models import Group, Post
+from core.paginator import NEXT, PREVIOUS, CursorPaginator
+from ..feed import FeedPaginator, follow_feed
+from ..models import Follow, Group, Post
 
 User = get_user_model()
 
@@ -58,3 +62,68 @@ class PostModelTest(TestCase):
                 self.assertEqual(
                     post._meta.get_field(value).help_text, expected
                 )
+
+
+def query_plan(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return ' '.join(row[-1] for row in cursor.fetchall())
+
+
+class QueryPlanTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='auth')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user, group=cls.group, text='Тестовый пост')
+
+    def test_listings_use_indexes(self):
+        """Ленты читаются по индексу без сортировки во временном B-дереве."""
+        listings = {
+            'post_pub_date_idx': Post.objects.all(),
+            'post_author_pub_date_idx': self.user.posts.all(),
+            'post_group_pub_date_idx': self.group.posts.all(),
+        }
+        for index, queryset in listings.items():
+            paginator = CursorPaginator(queryset, 10)
+            cursor_window = paginator.window(
+                paginator.object_list, NEXT, timezone.now(), self.post.pk)
+            for page_query in (paginator.object_list[:10],
+                               cursor_window[:11]):
+                with self.subTest(index=index):
+                    plan = query_plan(page_query)
+                    self.assertIn(index, plan)
+                    self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_follow_feed_uses_timeline_index(self):
+        """Окно ленты подписок — диапазон индекса Timeline без сортировки."""
+        paginator = FeedPaginator(follow_feed(self.user, []), 10)
+        windows = {
+            'first': (NEXT, None, None),
+            'next': (NEXT, timezone.now(), self.post.pk),
+            'previous': (PREVIOUS, timezone.now(), self.post.pk),
+        }
+        for name, position in windows.items():
+            with self.subTest(window=name):
+                plan = query_plan(paginator.timeline_window(*position, 11))
+                self.assertIn('timeline_user_pub_date_idx', plan)
+                self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_comments_use_index(self):
+        """Комментарии поста читаются по индексу (post, created)."""
+        plan = query_plan(self.post.comments.all())
+        self.assertIn('comment_post_created_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_follow_is_unique(self):
+        """Повторная подписка запрещена на уровне БД."""
+        author = User.objects.create_user(username='author')
+        Follow.objects.create(user=self.user, author=author)
+        with self.assertRaises(IntegrityError):
+            Follow.objects.create(user=self.user, author=author)
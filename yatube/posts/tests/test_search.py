@@ -0,0 +1,76 @@
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.admin import PostAdmin
+from posts.models import Post
+from posts.search import SearchPaginator
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='author')
+        for number in range(12):
+            Post.objects.create(author=cls.user,
+                                text=f'Котики и <b>собаки</b> {number}')
+        cls.other = Post.objects.create(author=cls.user, text='Про птиц')
+
+    def search(self, **params):
+        return self.client.get(reverse('posts:search'), params)
+
+    def test_search_finds_and_highlights(self):
+        """Поиск находит посты и подсвечивает совпадения."""
+        response = self.search(q='собак')
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertNotIn(self.other, page_obj)
+        self.assertContains(response, '&lt;b&gt;<mark>собаки</mark>')
+
+    def test_search_cursor_pagination(self):
+        """Выдача листается курсором без повторов."""
+        first_page = self.search(q='котики').context['page_obj']
+        second_page = self.search(
+            q='котики', cursor=first_page.next_cursor).context['page_obj']
+        self.assertEqual(len(second_page), 2)
+        self.assertFalse(second_page.has_next())
+        self.assertFalse({post.pk for post in first_page}
+                         & {post.pk for post in second_page})
+
+    def test_index_follows_edits(self):
+        """Индекс обновляется при изменении и удалении поста."""
+        self.other.text = 'Про рыб'
+        self.other.save()
+        self.assertEqual(list(self.search(q='рыб').context['page_obj']),
+                         [self.other])
+        self.assertFalse(self.search(q='птиц').context['page_obj'])
+        self.other.delete()
+        self.assertFalse(self.search(q='рыб').context['page_obj'])
+
+    def test_rank_window_limits_to_latest_matches(self):
+        """Ранжируются только самые свежие совпадения."""
+        paginator = SearchPaginator('котики', 10, rank_window=3)
+        page_obj = paginator.get_cursor_page(None)
+        latest = Post.objects.filter(text__startswith='Котики').order_by(
+            '-pk').values_list('pk', flat=True)[:3]
+        self.assertEqual({post.pk for post in page_obj}, set(latest))
+
+    def test_query_syntax_is_escaped(self):
+        """Спецсимволы FTS5 в запросе не ломают страницу."""
+        response = self.search(q='"котики" OR NEAR(')
+        self.assertEqual(response.status_code, 200)
+
+    def test_control_characters_are_ignored(self):
+        """Управляющие символы в запросе разделяют слова."""
+        response = self.search(q='птиц\x00про')
+        self.assertEqual(list(response.context['page_obj']), [self.other])
+
+    def test_admin_search_uses_index(self):
+        post_admin = PostAdmin(Post, admin.site)
+        queryset, use_distinct = post_admin.get_search_results(
+            None, Post.objects.all(), 'птиц')
+        self.assertEqual(list(queryset), [self.other])
+        self.assertFalse(use_distinct)
@@ -0,0 +1,235 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core.storage import (forget_media_access, media_accessed, touch_media,
+                          walk_files)
+from core.testing import run_on_commit
+from posts.models import MediaFile, Post
+from posts.versions import scope, versions
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedStorageTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, name='meme.gif'):
+        return Post.objects.create(
+            author=self.user, text='Мем',
+            image=SimpleUploadedFile(name, SMALL_GIF, 'image/gif'))
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые картинки хранятся одним файлом с именем по хешу."""
+        first = self.create_post('one.gif')
+        second = self.create_post('two.GIF')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertRegex(first.image.name,
+                         r'^posts/[0-9a-f]{2}/[0-9a-f]{2}/[0-9a-f]{64}\.gif$')
+        self.assertEqual(MediaFile.objects.get(name=first.image.name).refs,
+                         2)
+
+    def test_file_removed_with_last_reference(self):
+        """Файл и его миниатюры удаляются вместе с последним постом."""
+        first = self.create_post()
+        second = self.create_post()
+        storage = first.image.storage
+        name = first.image.name
+        thumbnail = get_thumbnail(first.image, '10x10')
+        with run_on_commit():
+            first.delete()
+            second.delete()
+        self.assertFalse(storage.exists(name))
+        self.assertFalse(thumbnail.exists())
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_replaced_image_released(self):
+        post = self.create_post()
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('new.gif', SMALL_GIF + b'\x00')
+        post.save()
+        self.assertFalse(MediaFile.objects.filter(name=old_name).exists())
+        self.assertEqual(MediaFile.objects.get(name=post.image.name).refs, 1)
+
+    def test_shard_media_moves_legacy_files(self):
+        """Старые файлы переезжают в каталоги по хешу вместе со ссылками."""
+        post = self.create_post()
+        storage = post.image.storage
+        self.assertTrue(storage.is_sharded(post.image.name))
+        legacy_name = FileSystemStorage(
+            location=TEMP_MEDIA_ROOT).save('posts/legacy.gif',
+                                           ContentFile(SMALL_GIF + b'\x01'))
+        legacy = [
+            Post.objects.create(author=self.user, text='Старый',
+                                image=legacy_name)
+            for _ in range(2)
+        ]
+        before = versions(*(scope('post', old.pk) for old in legacy))
+        with run_on_commit():
+            call_command('shard_media', batch_size=2, stdout=StringIO())
+        self.assertNotEqual(
+            versions(*(scope('post', old.pk) for old in legacy)), before)
+        for old_post in legacy:
+            old_post.refresh_from_db()
+            self.assertTrue(storage.is_sharded(old_post.image.name))
+            self.assertTrue(storage.exists(old_post.image.name))
+        self.assertFalse(storage.exists(legacy_name))
+        self.assertFalse(MediaFile.objects.filter(name=legacy_name).exists())
+        self.assertEqual(
+            MediaFile.objects.get(name=legacy[0].image.name).refs, 2)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CollectMediaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def create_post(self, number):
+        return Post.objects.create(
+            author=self.user, text='Мем',
+            image=SimpleUploadedFile(f'{number}.gif',
+                                     SMALL_GIF + bytes([number])))
+
+    def setUp(self):
+        # Записи sorl-thumbnail в кэше переживают откат БД между тестами.
+        cache.clear()
+
+    def collect(self, **options):
+        call_command('collect_media', min_age=0, stdout=StringIO(),
+                     **options)
+
+    def test_orphans_removed(self):
+        """Файлы без постов и миниатюры удалённых картинок удаляются."""
+        kept = self.create_post(1)
+        kept_thumbnail = get_thumbnail(kept.image, '10x10')
+        orphan = FileSystemStorage(location=TEMP_MEDIA_ROOT).save(
+            'posts/orphan.gif', ContentFile(SMALL_GIF))
+        # Так миниатюры теряют картинку после shard_media.
+        moved = self.create_post(2)
+        moved_thumbnail = get_thumbnail(moved.image, '10x10')
+        default.kvstore.delete(ImageFile(moved.image), False)
+        Post.objects.filter(pk=moved.pk).update(image='posts/moved.gif')
+
+        self.collect()
+        storage = kept.image.storage
+        self.assertFalse(storage.exists(orphan))
+        self.assertTrue(storage.exists(kept.image.name))
+        self.assertTrue(kept_thumbnail.exists())
+        self.assertFalse(moved_thumbnail.exists())
+        self.assertIsNone(default.kvstore.get(moved_thumbnail))
+
+    def test_least_recently_used_evicted(self):
+        """Сверх предела объёма удаляются давно не открывавшиеся миниатюры."""
+        posts = [self.create_post(number) for number in range(3)]
+        found = [get_thumbnail(post.image, '10x10') for post in posts]
+        now = time.time()
+        created = now - 24 * 60 * 60
+        for hours, post, thumbnail in zip((3, 2, 1), posts, found):
+            os.utime(thumbnail.storage.path(thumbnail.name),
+                     (created, created))
+            # Показ в ленте записывает время обращения, atime не важен.
+            with mock.patch('core.storage.time.time',
+                            return_value=now - hours * 60 * 60):
+                touch_media({thumbnail.name: post.image.name})
+        size = found[0].storage.size(found[0].name)
+        post_scope = scope('post', posts[0].pk)
+        before = versions(post_scope)
+
+        self.collect(max_bytes=size, dry_run=True)
+        self.assertTrue(all(thumbnail.exists() for thumbnail in found))
+        self.collect(max_bytes=size)
+        self.assertEqual([thumbnail.exists() for thumbnail in found],
+                         [False, False, True])
+        self.assertIsNone(default.kvstore.get(found[0]))
+        self.assertNotEqual(versions(post_scope), before)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_shown_thumbnails_record_access(self):
+        """Показ в ленте и отдача миниатюры записывают обращение."""
+        post = self.create_post(1)
+        self.client.get(reverse('posts:index'))
+        names = [name for name, stat in walk_files(
+            post.image.storage, sorl_settings.THUMBNAIL_PREFIX)]
+        self.assertTrue(names)
+        self.assertEqual(
+            {source for _, source in media_accessed(names).values()},
+            {post.image.name})
+        forget_media_access(names)
+        self.client.get(settings.MEDIA_URL + names[0])
+        self.assertIn(names[0], media_accessed(names))
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImageMetadataTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_metadata_filled_on_save(self):
+        """Размер и цвет картинки сохраняются вместе с постом."""
+        post = Post.objects.create(
+            author=self.user, text='Мем',
+            image=SimpleUploadedFile('meme.gif', SMALL_GIF, 'image/gif'))
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertRegex(post.image_color, r'^#[0-9a-f]{6}$')
+        post.image = None
+        post.save()
+        self.assertIsNone(post.image_width)
+
+    def test_backfill_command(self):
+        post = Post.objects.create(
+            author=self.user, text='Мем',
+            image=SimpleUploadedFile('meme.gif', SMALL_GIF, 'image/gif'))
+        broken = Post.objects.create(author=self.user, text='Нет файла',
+                                     image='posts/missing.gif')
+        Post.objects.update(image_width=None, image_height=None)
+        call_command('backfill_image_metadata', stdout=StringIO())
+        post.refresh_from_db()
+        broken.refresh_from_db()
+        self.assertEqual((post.image_width, post.image_height), (2, 1))
+        self.assertIsNone(broken.image_width)
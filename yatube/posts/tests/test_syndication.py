@@ -0,0 +1,94 @@
+import json
+from xml.etree import ElementTree
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+User = get_user_model()
+
+ATOM = '{http://www.w3.org/2005/Atom}'
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа', slug='test-slug',
+            description='Тестовое описание')
+        cls.posts = [
+            Post.objects.create(author=cls.author, group=cls.group,
+                                text=f'Пост номер {number}')
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **headers):
+        """Ответ и его тело; потоковый ответ дочитывается до конца."""
+        response = self.client.get(url, **headers)
+        if response.streaming:
+            return response, b''.join(response.streaming_content)
+        return response, response.content
+
+    def test_formats(self):
+        """Ленты всех областей во всех форматах содержат их посты."""
+        urls = [
+            reverse('posts:index_feed', args=['rss']),
+            reverse('posts:group_feed', args=['test-slug', 'atom']),
+            reverse('posts:author_feed', args=['author', 'json']),
+        ]
+        (rss, rss_body), (_, atom_body), (_, json_body) = (
+            self.get(url) for url in urls)
+        self.assertTrue(rss['Content-Type'].startswith('application/rss+xml'))
+        items = ElementTree.fromstring(rss_body).findall('channel/item')
+        self.assertEqual(items[0].find('description').text, 'Пост номер 2')
+        entries = ElementTree.fromstring(atom_body).findall(
+            f'{ATOM}entry')
+        self.assertEqual(len(entries), 3)
+        items = json.loads(json_body)['items']
+        self.assertEqual([item['content_text'] for item in items],
+                         [f'Пост номер {number}' for number in (2, 1, 0)])
+        self.assertEqual(items[0]['tags'], ['Тестовая группа'])
+
+    def test_unchanged_feed_not_modified(self):
+        url = reverse('posts:index_feed', args=['atom'])
+        response, _ = self.get(url)
+        for headers in ({'HTTP_IF_NONE_MATCH': response['ETag']},
+                        {'HTTP_IF_MODIFIED_SINCE':
+                         response['Last-Modified']}):
+            repeat, body = self.get(url, **headers)
+            self.assertEqual(repeat.status_code, 304)
+            self.assertEqual(body, b'')
+        Post.objects.create(author=self.author, text='Новый пост')
+        changed, body = self.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertIn('Новый пост', body.decode())
+
+    def test_cached_feed_served_without_queries(self):
+        url = reverse('posts:index_feed', args=['rss'])
+        _, first = self.get(url)
+        with self.assertNumQueries(0):
+            _, second = self.get(url)
+        self.assertEqual(second, first)
+
+    @override_settings(FEED_POSTS_COUNT=2)
+    def test_cursor_window(self):
+        """Окно ленты ограничено, а дальше ведёт ссылка rel="next"."""
+        _, body = self.get(reverse('posts:index_feed', args=['json']))
+        feed = json.loads(body)
+        self.assertEqual(len(feed['items']), 2)
+        rest = json.loads(self.get(feed['next_url'])[1])
+        self.assertEqual([item['content_text'] for item in rest['items']],
+                         ['Пост номер 0'])
+        self.assertNotIn('next_url', rest)
+
+    def test_unknown_format(self):
+        response = self.client.get(
+            reverse('posts:index_feed', args=['csv']))
+        self.assertEqual(response.status_code, 404)
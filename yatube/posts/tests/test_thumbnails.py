@@ -0,0 +1,162 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+
+from posts import thumbnails
+from posts.models import Post
+from posts.versions import page_scopes
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=2)
+class ThumbnailTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='author')
+        cls.post = Post.objects.create(
+            author=cls.user, text='С картинкой',
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'))
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        shutil.rmtree(os.path.join(TEMP_MEDIA_ROOT, 'cache'),
+                      ignore_errors=True)
+
+    def test_ready_name_matches_sorl(self):
+        """Готовая миниатюра ищется под тем же именем, что нарезает sorl."""
+        geometry = settings.POST_THUMBNAIL_DEFAULT
+        options = settings.POST_THUMBNAIL_OPTIONS
+        expected = get_thumbnail(self.post.image, geometry, **options)
+        [found] = thumbnails.backend.get_ready_many(
+            [(self.post.image, None, geometry)], **options)
+        self.assertEqual(found.name, expected.name)
+
+    def test_page_shows_placeholder_until_ready(self):
+        """Страница не нарезает миниатюру, а ставит её в очередь."""
+        with mock.patch('posts.thumbnails.schedule') as schedule, \
+                mock.patch.object(thumbnails.backend,
+                                  'create_many') as generate:
+            response = self.client.get(reverse('posts:index'))
+        generate.assert_not_called()
+        schedule.assert_called_once()
+        self.assertNotContains(response, '<img class="card-img')
+        self.assertContains(response, 'aspect-ratio: 960 / 339')
+
+        with override_settings(THUMBNAIL_WORKERS=0):
+            thumbnails.pregenerate(self.post)
+        cache.clear()
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, '<img class="card-img')
+
+    def test_generation_invalidates_fragments(self):
+        """Нарезка в пуле сбрасывает ленты, закэшированные с заглушкой."""
+        geometry = settings.POST_THUMBNAIL_DEFAULT
+        options = settings.POST_THUMBNAIL_OPTIONS
+        requests = [(self.post.image, None, geometry)]
+        self.assertEqual(
+            thumbnails.backend.get_ready_many(requests, **options), [None])
+        with mock.patch('posts.thumbnails.bump') as bump:
+            thumbnails._generate(self.post.image, ['name'], [geometry],
+                                 options, ['index'])
+        bump.assert_called_once_with('index')
+        [thumbnail] = thumbnails.backend.get_ready_many(requests, **options)
+        self.assertEqual(thumbnail.size, [960, 339])
+
+    def test_schedule_on_read_makes_no_queries(self):
+        """Очередь из запроса страницы не ищет подписчиков автора."""
+        with mock.patch.object(thumbnails, '_pending', set()), \
+                mock.patch('posts.thumbnails._get_executor') as executor, \
+                self.assertNumQueries(0):
+            thumbnails.schedule(self.post, [settings.POST_THUMBNAIL_DEFAULT],
+                                **settings.POST_THUMBNAIL_OPTIONS)
+        scopes = executor.return_value.submit.call_args[0][-1]
+        self.assertEqual(scopes, page_scopes(self.post))
+
+    def test_listing_reads_no_files(self):
+        """Лента с картинками не обращается к файловой системе."""
+        geometry = settings.POST_THUMBNAIL_DEFAULT
+        options = settings.POST_THUMBNAIL_OPTIONS
+        for number in range(9):
+            Post.objects.create(
+                author=self.user, text=f'Картинка {number}',
+                image=SimpleUploadedFile(
+                    f'{number}.gif', SMALL_GIF + bytes([number]),
+                    'image/gif'))
+        for post in Post.objects.all():
+            thumbnails._generate(post.image, [], [geometry], options, [])
+        with mock.patch.object(FileSystemStorage, 'path',
+                               side_effect=AssertionError('чтение файла')):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.content.count(b'<img class="card-img'), 10)
+
+    def test_page_thumbnails_fetched_in_one_lookup(self):
+        """Миниатюры страницы ищутся разом, а не по одной на пост."""
+        geometry = settings.POST_THUMBNAIL_DEFAULT
+        options = settings.POST_THUMBNAIL_OPTIONS
+        for number in range(9):
+            Post.objects.create(
+                author=self.user, text=f'Картинка {number}',
+                image=SimpleUploadedFile(
+                    f'{number}.gif', SMALL_GIF + bytes([number]),
+                    'image/gif'))
+        posts = list(Post.objects.all())
+        for post in posts:
+            thumbnails._generate(post.image, [], [geometry], options, [])
+        thumbnails.prefetch_thumbnails(posts)
+        # Записи хранилища ключей уже есть; из кэша их убираем, чтобы
+        # проверить и обращение к БД.
+        cache.clear()
+        posts = list(Post.objects.all())
+        with self.assertNumQueries(1):
+            thumbnails.prefetch_thumbnails(posts)
+            found = [thumbnails.responsive_thumbnail(post) for post in posts]
+        self.assertEqual([im['src'].size for im in found], [[960, 339]] * 10)
+
+    @override_settings(THUMBNAIL_WORKERS=0)
+    def test_srcset_sizes_from_one_decode(self):
+        """Все размеры srcset режутся из одного декодирования; размеры
+        больше исходника пропускаются."""
+        buffer = io.BytesIO()
+        Image.new('RGB', (1500, 900), 'teal').save(buffer, 'JPEG')
+        post = Post.objects.create(
+            author=self.user, text='Большая картинка',
+            image=SimpleUploadedFile('big.jpg', buffer.getvalue(),
+                                     'image/jpeg'))
+        with mock.patch.object(default.engine, 'get_image',
+                               wraps=default.engine.get_image) as decode:
+            thumbnails.pregenerate(post)
+        decode.assert_called_once()
+        im = thumbnails.responsive_thumbnail(
+            Post.objects.get(pk=post.pk))
+        self.assertEqual(im['src'].size, [960, 339])
+        self.assertEqual(
+            [entry.rsplit(' ', 1)[1] for entry in im['srcset'].split(', ')],
+            ['480w', '960w', '1440w'])
@@ -0,0 +1,107 @@
+import io
+import json
+import os
+import shutil
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from posts.counters import user_stats
+from posts.models import Comment, Follow, Group, Post, Timeline
+
+User = get_user_model()
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'content.jsonl')
+        self.author = User.objects.create(username='author')
+        reader = User.objects.create(username='reader')
+        group = Group.objects.create(title='Группа', slug='group',
+                                     description='Описание')
+        self.posts = [
+            Post.objects.create(author=self.author, group=group,
+                                text=f'Пост {number}')
+            for number in range(3)
+        ]
+        Comment.objects.create(post=self.posts[0], author=reader,
+                               text='Комментарий')
+        Follow.objects.create(user=reader, author=self.author)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def call(self, name, *args, **options):
+        call_command(name, *args, stdout=io.StringIO(), **options)
+
+    def wipe(self):
+        User.objects.all().delete()
+        Group.objects.all().delete()
+
+    def test_round_trip(self):
+        """Загрузка выгрузки восстанавливает данные, даты и счётчики."""
+        pub_date = Post.objects.get(pk=self.posts[2].pk).pub_date
+        self.call('export_content', self.path)
+        self.wipe()
+        self.call('import_content', self.path, batch_size=2)
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.posts[2].pk)
+        self.assertEqual((post.author.username, post.group.slug,
+                          post.pub_date), ('author', 'group', pub_date))
+        self.assertEqual(Post.objects.get(pk=self.posts[0].pk)
+                         .comments_count, 1)
+        author = User.objects.get(username='author')
+        self.assertEqual(user_stats(author).posts_count, 3)
+        self.assertEqual(user_stats(author).followers_count, 1)
+        reader = User.objects.get(username='reader')
+        self.assertFalse(reader.has_usable_password())
+        self.assertEqual(Timeline.objects.filter(user=reader).count(), 3)
+
+    def test_imported_posts_reach_existing_followers(self):
+        """Загруженный пост попадает в ленту уже подписанного читателя."""
+        self.call('export_content', self.path, kinds=['post'])
+        Post.objects.filter(pk=self.posts[2].pk).delete()
+        reader = User.objects.get(username='reader')
+        self.client.force_login(reader)
+        self.client.get(reverse('posts:follow_index'))
+        self.call('import_content', self.path)
+        self.assertTrue(Timeline.objects.filter(
+            user=reader, post_id=self.posts[2].pk).exists())
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertContains(response, 'Пост 2')
+
+    def test_repeated_import_skips_loaded_rows(self):
+        self.call('export_content', self.path)
+        self.wipe()
+        self.call('import_content', self.path)
+        # Загрузка, прерванная до записи позиции, повторяется целиком.
+        self.call('import_content', self.path, restart=True)
+        self.assertEqual(Post.objects.count(), 3)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertEqual(Follow.objects.count(), 1)
+        self.assertEqual(Post.objects.get(pk=self.posts[0].pk)
+                         .comments_count, 1)
+        author = User.objects.get(username='author')
+        self.assertEqual(user_stats(author).posts_count, 3)
+
+    def test_resume_from_checkpoint(self):
+        self.call('export_content', self.path, kinds=['group', 'post'])
+        self.wipe()
+        with open(self.path + '.checkpoint', 'w') as checkpoint:
+            with open(self.path, 'rb') as source:
+                first_lines = source.readline() + source.readline()
+            json.dump({'offset': len(first_lines), 'line': 2,
+                       'created': 2}, checkpoint)
+        Group.objects.create(title='Группа', slug='group',
+                             description='Описание')
+        self.call('import_content', self.path)
+        # Первый пост считается загруженным до прерывания.
+        self.assertEqual(
+            sorted(Post.objects.values_list('pk', flat=True)),
+            [post.pk for post in self.posts[1:]])
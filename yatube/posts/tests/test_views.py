@@ -10,7 +10,9 @@ from django.core.cache import cache
 from django.conf import settings
 from django import forms
 
-from posts.models import Post, Group, Follow
+from core.testing import query_budget
+from posts.models import Comment, Post, Group, Follow
+from posts.versions import scope, versions
 
 test_posts: int = 15
 User = get_user_model()
@@ -19,7 +21,7 @@ User = get_user_model()
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
-@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
 class PostViewsTests(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -91,7 +93,7 @@ class PostViewsTests(TestCase):
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertIn('page_obj', response.context)
         post_image = Post.objects.last().image
-        self.assertEqual(post_image, 'posts/small.gif')
+        self.assertEqual(post_image, self.post.image)
 
     def test_first_page_index_page_contains_ten_records(self):
         # Проверка: количество постов на первой странице равно 10.
@@ -116,7 +118,7 @@ class PostViewsTests(TestCase):
                          'Тестовое описание')
         self.assertEqual(response.context.get('group').slug, 'test-slug')
         post_image = Post.objects.last().image
-        self.assertEqual(post_image, 'posts/small.gif')
+        self.assertEqual(post_image, self.post.image)
 
     def test_first_page_group_posts_page_contains_ten_records(self):
         # Проверка: количество постов на первой странице равно 10.
@@ -131,6 +133,37 @@ class PostViewsTests(TestCase):
                     kwargs={'slug': 'test-slug'}) + '?page=2')
         self.assertEqual(len(response.context['page_obj']), 5)
 
+    def test_cursor_pagination(self):
+        """Курсор ведёт на соседние страницы без пропусков и повторов."""
+        url = reverse('posts:index')
+        first_page = self.client.get(url).context['page_obj']
+        self.assertIsNone(first_page.previous_cursor)
+        response = self.client.get(url, {'cursor': first_page.next_cursor})
+        second_page = response.context['page_obj']
+        self.assertTrue(second_page.is_cursor)
+        self.assertEqual(len(second_page), 5)
+        self.assertFalse(second_page.has_next())
+        self.assertTrue(second_page.has_previous())
+        ids = [post.pk for post in first_page] + [
+            post.pk for post in second_page]
+        self.assertEqual(
+            ids, list(Post.objects.order_by('-pub_date', '-pk')
+                      .values_list('pk', flat=True)))
+        response = self.client.get(
+            url, {'cursor': second_page.previous_cursor})
+        self.assertEqual(list(response.context['page_obj']),
+                         list(first_page))
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_broken_cursor_returns_first_page(self):
+        """Битый курсор не ломает страницу, а ведёт на первую."""
+        response = self.client.get(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['page_obj'].number, 1)
+        self.assertEqual(len(response.context['page_obj']), 10)
+
     def test_profile_page_show_correct_context(self):
         """Шаблон profile сформирован с правильным контекстом."""
         response = self.authorized_client.get(
@@ -142,7 +175,7 @@ class PostViewsTests(TestCase):
         self.assertIn('posts_count', response.context)
         self.assertIn('page_obj', response.context)
         post_image = Post.objects.last().image
-        self.assertEqual(post_image, 'posts/small.gif')
+        self.assertEqual(post_image, self.post.image)
 
     def test_first_page_profile_page_contains_ten_records(self):
         # Проверка: количество постов на первой странице равно 10.
@@ -164,7 +197,7 @@ class PostViewsTests(TestCase):
         self.assertIn('post', response.context)
         self.assertIn('posts_count', response.context)
         post_image = Post.objects.last().image
-        self.assertEqual(post_image, 'posts/small.gif')
+        self.assertEqual(post_image, self.post.image)
 
     def test_post_create_show_correct_context(self):
         """Шаблон post_create сформирован с правильным контекстом."""
@@ -193,31 +226,48 @@ class PostViewsTests(TestCase):
                 self.assertIsInstance(form_field, expected)
 
     def test_posts_index_cache(self):
-        """Кэш на главной странице работает правильно."""
+        """Кэш главной страницы сбрасывается записью, а не таймаутом."""
         cache.clear()
-        # Первый запрос: пост создан, но его нет в кэше
         self.authorized_client.get(reverse('posts:index'))
         cache_post = Post.objects.create(
             text="Тест-кэш",
             author=self.user
         )
+        # Новый пост виден сразу: создание поста меняет версию ленты
         response_2 = self.authorized_client.get(reverse('posts:index'))
-        # Пост создан, но его нет во втором запросе,
-        self.assertNotIn(cache_post.text, response_2.content.decode())
-        # Чистим кэш
-        cache.clear()
-        # Делаем третий запрос
+        self.assertIn(cache_post.text, response_2.content.decode())
+        # Изменение мимо сигналов версию не меняет — фрагмент из кэша
+        Post.objects.filter(pk=cache_post.pk).update(text='Тест-правка')
         response_3 = self.authorized_client.get(reverse('posts:index'))
-        # Удаляем пост
-        cache_post.delete()
-        # Пост должен быть в кэше в третьем запросе, хотя он удалён
         self.assertIn(cache_post.text, response_3.content.decode())
-        # Чистим кэш
-        cache.clear()
-        # Делаем 4 запрос
+        # Удаление поста сбрасывает фрагмент
+        cache_post.delete()
         response_4 = self.authorized_client.get(reverse('posts:index'))
-        # Кэщ очищен, поста нет
         self.assertNotIn(cache_post.text, response_4.content.decode())
+        self.assertNotIn('Тест-правка', response_4.content.decode())
+
+    def test_listing_fragments_follow_writes(self):
+        """Фрагменты группы, профиля и поста сбрасываются при записи."""
+        cache.clear()
+        urls = (
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            reverse('posts:profile', kwargs={'username': 'User'}),
+        )
+        for url in urls:
+            self.authorized_client.get(url)
+        self.post.text = 'Отредактированный пост'
+        self.post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Отредактированный пост')
+        detail_url = reverse(
+            'posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.authorized_client.get(detail_url)
+        Comment.objects.create(
+            post=self.post, author=self.user, text='Свежий комментарий')
+        self.assertContains(
+            self.authorized_client.get(detail_url), 'Свежий комментарий')
 
 
 class FollowTests(TestCase):
@@ -265,3 +315,157 @@ class FollowTests(TestCase):
         # проверка, что запись не появилась у неподписанного пользователя
         response = self.following.get('/follow/')
         self.assertNotEqual(response, 'Тест поста в ленте подписчиков')
+
+
+class QueryBudgetTests(TestCase):
+    """Число запросов страниц не зависит от числа постов и комментариев."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        for _ in range(test_posts):
+            cls.post = Post.objects.create(
+                author=cls.author, group=cls.group, text='Тестовый пост')
+        for _ in range(5):
+            Comment.objects.create(
+                post=cls.post, author=cls.reader, text='Комментарий')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.reader)
+
+    def test_pages_fit_query_budget(self):
+        # Сессия и пользователь — 2 запроса на любой странице,
+        # на главной число постов оценивается тем же запросом, что и
+        # считается.
+        budgets = {
+            reverse('posts:index'): 4,
+            reverse('posts:index') + '?page=2': 4,
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}): 5,
+            reverse('posts:profile', kwargs={'username': 'author'}): 4,
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}): 4,
+            reverse('posts:follow_index'): 4,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                with query_budget(budget):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_cached_fragment_skips_posts_query(self):
+        """Страница из кэша фрагмента не выбирает посты."""
+        self.client.logout()
+        budgets = {
+            reverse('posts:index'): 0,
+            reverse('posts:index') + '?page=2': 0,
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}): 1,
+            reverse('posts:profile', kwargs={'username': 'author'}): 1,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.client.get(url)
+                with self.assertNumQueries(budget):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_query_budget_reports_excess(self):
+        with self.assertRaisesMessage(AssertionError, 'при бюджете 1'):
+            with query_budget(1):
+                list(Post.objects.all())
+                list(Group.objects.all())
+
+
+class ConditionalGetTests(TestCase):
+    """Неизменившиеся страницы отдаются ответом 304 без рендеринга."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(username='author')
+        cls.reader = User.objects.create(username='reader')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='test-slug',
+            description='Тестовое описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.author, group=cls.group, text='Тестовый пост')
+
+    def setUp(self):
+        cache.clear()
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        etag = response['ETag']
+        repeat = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat.templates, [])
+        self.assertEqual(repeat['ETag'], etag)
+        change()
+        changed = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], etag)
+
+    def test_post_detail(self):
+        self.assertRevalidates(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            lambda: Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий'))
+
+    def test_profile(self):
+        self.assertRevalidates(
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            lambda: Follow.objects.create(user=self.author,
+                                          author=self.reader))
+
+    def test_follow_keeps_author_fragments(self):
+        """Подписка меняет ETag профиля, но не версию постов автора."""
+        before = versions(scope('author', self.reader.pk))
+        self.assertRevalidates(
+            reverse('posts:profile', kwargs={'username': 'reader'}),
+            lambda: Follow.objects.create(user=self.author,
+                                          author=self.reader))
+        self.assertEqual(versions(scope('author', self.reader.pk)), before)
+
+    def test_group_list(self):
+        self.assertRevalidates(
+            reverse('posts:group_list', kwargs={'slug': 'test-slug'}),
+            lambda: Post.objects.create(author=self.reader,
+                                        group=self.group, text='Новый'))
+
+    def test_group_delete(self):
+        group = Group.objects.create(title='Удаляемая', slug='removed')
+        scopes = scope('index'), scope('group', group.pk)
+        before = versions(*scopes)
+        group.delete()
+        self.assertNotEqual(versions(*scopes), before)
+
+    def test_author_rename(self):
+        def rename():
+            self.author.first_name = 'Лев'
+            self.author.save()
+
+        for url in (reverse('posts:profile', kwargs={'username': 'author'}),
+                    reverse('posts:group_list', kwargs={'slug': 'test-slug'})):
+            with self.subTest(url=url):
+                before = versions(scope('index'))
+                self.assertRevalidates(url, rename)
+                self.assertNotEqual(versions(scope('index')), before)
+
+    def test_login_keeps_author_fragments(self):
+        before = versions(scope('author', self.reader.pk))
+        self.client.force_login(self.reader)
+        self.assertEqual(versions(scope('author', self.reader.pk)), before)
+
+    def test_etag_depends_on_user(self):
+        url = reverse('posts:group_list', kwargs={'slug': 'test-slug'})
+        etag = self.client.get(url)['ETag']
+        self.client.force_login(self.reader)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
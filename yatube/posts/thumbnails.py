@@ -0,0 +1,370 @@
+"""Фоновая нарезка миниатюр картинок постов.
+
+Миниатюры всех размеров из settings.POST_THUMBNAIL_SIZES готовятся пулом
+потоков сразу после загрузки картинки, за одно декодирование исходника.
+Шаблоны берут только готовые миниатюры и, пока их нет, показывают
+заглушку, поэтому запрос страницы не декодирует исходную картинку.
+
+Поток пула не обращается к БД: он пишет файлы миниатюр в хранилище,
+оставляет их размеры в кэше и сбрасывает версии фрагментов, а в хранилище
+ключей sorl-thumbnail миниатюру заносит первый запрос, который её найдёт.
+Запрос страницы не трогает файловую систему: размер исходной картинки
+берётся из полей Post, а готовность миниатюры — из кэша. Миниатюры всей
+страницы ленты ищутся разом (prefetch_thumbnails): одним cache.get_many
+и, для промахов кэша, одним запросом к БД.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore
+
+from core.storage import forget_media_access, touch_media
+from .versions import bump, page_scopes, post_scopes
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд снова пробовать нарезать картинку после ошибки
+RETRY_AFTER = 10 * 60
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _size_key(name):
+    return f'thumbnail-size:{name}'
+
+
+def _failed_key(name):
+    return f'thumbnail-failed:{name}'
+
+
+class BackgroundThumbnailBackend(ThumbnailBackend):
+    """Бэкенд, который разделяет поиск готовой миниатюры и нарезку."""
+
+    def _options(self, source, options):
+        # Те же умолчания, что в ThumbnailBackend.get_thumbnail(),
+        # чтобы имя файла миниатюры совпадало.
+        options = dict(options)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        return options
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        source = ImageFile(file_)
+        options = self._options(source, options)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def get_ready_many(self, requests, **options):
+        """Готовые миниатюры для списка (файл, размер исходника, размер).
+
+        Вместо неготовой миниатюры — None; файлы не читаются. Записи
+        хранилища ключей читаются одним cache.get_many, промахи кэша —
+        одним запросом к БД, размеры нарезанных пулом миниатюр — ещё
+        одним cache.get_many.
+        """
+        thumbnails = [
+            self.thumbnail_file(file_, geometry_string, **options)
+            for file_, source_size, geometry_string in requests]
+        keys = [add_prefix(thumbnail.key, 'image')
+                for thumbnail in thumbnails]
+        kv_cache = default.kvstore.cache
+        values = kv_cache.get_many(keys)
+        missing = [key for key in keys if key not in values]
+        if missing:
+            stored = dict(KVStore.objects.filter(key__in=missing)
+                          .values_list('key', 'value'))
+            # Как sorl: отсутствие записи тоже кэшируется.
+            found = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+            kv_cache.set_many(found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT)
+            values.update(found)
+        result = [None] * len(requests)
+        unready = []
+        for index, key in enumerate(keys):
+            value = values[key]
+            if value and value != EMPTY_VALUE:
+                result[index] = deserialize_image_file(value)
+            else:
+                unready.append(index)
+        if unready:
+            sizes = cache.get_many(
+                [_size_key(thumbnails[index].name) for index in unready])
+            for index in unready:
+                size = sizes.get(_size_key(thumbnails[index].name))
+                if size is not None:
+                    file_, source_size, geometry_string = requests[index]
+                    result[index] = self._register(
+                        thumbnails[index], size, file_, source_size)
+        return result
+
+    @staticmethod
+    def _register(thumbnail, size, file_, source_size):
+        # Файл нарезан пулом. Миниатюра записывается за исходной
+        # картинкой, чтобы удаляться вместе с ней.
+        thumbnail.set_size(size)
+        source = ImageFile(file_)
+        if source_size is not None:
+            source.set_size(source_size)
+        source = default.kvstore.get_or_set(source)
+        default.kvstore.set(thumbnail, source)
+        return thumbnail
+
+    def create_many(self, file_, geometry_strings, **options):
+        """Нарезает миниатюры нескольких размеров за одно декодирование.
+
+        Файлы пишутся в хранилище, минуя хранилище ключей.
+        """
+        source = ImageFile(file_)
+        options = self._options(source, options)
+        thumbnails = []
+        missing = []
+        for geometry_string in geometry_strings:
+            name = self._get_thumbnail_filename(source, geometry_string,
+                                                options)
+            thumbnail = ImageFile(name, default.storage)
+            if thumbnail.exists():
+                # Нарезана раньше, но запись о ней из кэша пропала.
+                thumbnail.set_size()
+            else:
+                missing.append((geometry_string, thumbnail))
+            thumbnails.append(thumbnail)
+        if missing:
+            # Pillow декодирует исходник при первой операции и дальше
+            # режет все размеры из тех же пикселей.
+            source_image = default.engine.get_image(source)
+            try:
+                options['image_info'] = default.engine.get_image_info(
+                    source_image)
+                for geometry_string, thumbnail in missing:
+                    self._create_thumbnail(source_image, geometry_string,
+                                           options, thumbnail)
+                    self._create_alternative_resolutions(
+                        source_image, geometry_string, options,
+                        thumbnail.name)
+            finally:
+                default.engine.cleanup(source_image)
+        cache.set_many(
+            {_size_key(thumbnail.name): thumbnail.size
+             for thumbnail in thumbnails},
+            settings.FRAGMENT_CACHE_TIMEOUT)
+        return thumbnails
+
+
+backend = BackgroundThumbnailBackend()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails')
+        return _executor
+
+
+def _generate(image, names, geometry_strings, options, scopes):
+    try:
+        backend.create_many(image, geometry_strings, **options)
+        # Ленты могли закэшироваться с заглушкой вместо картинки.
+        bump(*scopes)
+    except Exception:
+        logger.exception('Не удалось нарезать миниатюры %s', image)
+        # Битую или пропавшую картинку не пробуем нарезать на каждый показ.
+        cache.set_many({_failed_key(name): True for name in names},
+                       RETRY_AFTER)
+    finally:
+        with _lock:
+            _pending.difference_update(names)
+
+
+def schedule(post, geometry_strings, scopes=None, **options):
+    """Ставит нарезку миниатюр в очередь одной задачей на картинку.
+
+    Размеры, которые уже стоят в очереди или недавно не нарезались,
+    пропускаются. После нарезки сбрасываются области scopes, по
+    умолчанию — области, известные без запросов к БД (page_scopes).
+    """
+    names = {
+        geometry_string: backend.thumbnail_file(
+            post.image, geometry_string, **options).name
+        for geometry_string in geometry_strings}
+    failed = cache.get_many([_failed_key(name) for name in names.values()])
+    with _lock:
+        geometry_strings = [
+            geometry_string for geometry_string, name in names.items()
+            if name not in _pending and _failed_key(name) not in failed]
+        if not geometry_strings:
+            return
+        names = [names[geometry_string]
+                 for geometry_string in geometry_strings]
+        _pending.update(names)
+    if scopes is None:
+        scopes = page_scopes(post)
+    _get_executor().submit(_generate, post.image, names, geometry_strings,
+                           options, scopes)
+
+
+def forget_thumbnails(names):
+    """Убирает записи о миниатюрах, файлы которых удалены.
+
+    Без них поиск готовой миниатюры снова поставит её в очередь.
+    """
+    keys = [add_prefix(ImageFile(name, default.storage).key, 'image')
+            for name in names]
+    KVStore.objects.filter(key__in=keys).delete()
+    default.kvstore.cache.delete_many(keys)
+    cache.delete_many([_size_key(name) for name in names])
+    forget_media_access(names)
+
+
+def post_geometries(post):
+    """Размеры миниатюр картинки поста для srcset.
+
+    Размеры больше исходной картинки пропускаются, чтобы не нарезать
+    растянутые копии; основной размер есть всегда.
+    """
+    geometry_strings = []
+    for geometry_string in settings.POST_THUMBNAIL_SIZES:
+        width, height = map(int, geometry_string.split('x'))
+        fits = (post.image_width and post.image_height
+                and width <= post.image_width
+                and height <= post.image_height)
+        if fits or geometry_string == settings.POST_THUMBNAIL_DEFAULT:
+            geometry_strings.append(geometry_string)
+    return geometry_strings
+
+
+def pregenerate(post):
+    """Готовит все миниатюры поста после загрузки картинки."""
+    if not post.image:
+        return
+    geometry_strings = post_geometries(post)
+    if settings.THUMBNAIL_WORKERS:
+        # Пост только что записан: ленты подписчиков тоже сбрасываются.
+        schedule(post, geometry_strings, post_scopes(post),
+                 **settings.POST_THUMBNAIL_OPTIONS)
+    else:
+        _create_now(post, geometry_strings, settings.POST_THUMBNAIL_OPTIONS)
+
+
+def _source_size(post):
+    if post.image_width and post.image_height:
+        return post.image_width, post.image_height
+    return None
+
+
+def _prefetch_key(geometry_string, options):
+    return geometry_string, tuple(sorted(options.items()))
+
+
+def _prefetched(post):
+    return post.__dict__.setdefault('_prefetched_thumbnails', {})
+
+
+def _create_now(post, geometry_strings, options):
+    """Нарезает миниатюры прямо в запросе (THUMBNAIL_WORKERS = 0)."""
+    try:
+        created = backend.create_many(post.image, geometry_strings,
+                                      **options)
+    except Exception:
+        logger.exception('Не удалось нарезать миниатюры %s', post.image)
+        return
+    for geometry_string, thumbnail in zip(geometry_strings, created):
+        backend._register(thumbnail, thumbnail.size, post.image,
+                          _source_size(post))
+        _prefetched(post)[_prefetch_key(geometry_string, options)] = \
+            thumbnail
+
+
+def _prefetch(requests, options):
+    """Ищет миниатюры для пар (пост, размер) одним get_ready_many().
+
+    Результат запоминается в постах; недостающие миниатюры ставятся в
+    очередь, а без пула потоков нарезаются сразу.
+    """
+    requests = [(post, geometry_string)
+                for post, geometry_string in requests if post.image]
+    if not requests:
+        return
+    found = backend.get_ready_many(
+        [(post.image, _source_size(post), geometry_string)
+         for post, geometry_string in requests], **options)
+    missing = {}
+    for (post, geometry_string), thumbnail in zip(requests, found):
+        _prefetched(post)[_prefetch_key(geometry_string, options)] = \
+            thumbnail
+        if thumbnail is None:
+            missing.setdefault(id(post), (post, []))[1].append(
+                geometry_string)
+    for post, geometry_strings in missing.values():
+        if settings.THUMBNAIL_WORKERS:
+            # Чтение страницы не ищет подписчиков автора: ленты подписок
+            # покажут миниатюру со следующим сбросом их версии.
+            schedule(post, geometry_strings, **options)
+        else:
+            _create_now(post, geometry_strings, options)
+    # Время показа решает, какие миниатюры вытеснит collect_media.
+    shown = {}
+    for post, geometry_string in requests:
+        thumbnail = _prefetched(post).get(
+            _prefetch_key(geometry_string, options))
+        if thumbnail is not None:
+            shown[thumbnail.name] = post.image.name
+    touch_media(shown)
+
+
+def prefetch_thumbnails(posts):
+    """Находит миниатюры srcset всех постов страницы одним поиском.
+
+    После этого responsive_thumbnail() для этих постов уже не
+    обращается к кэшу и БД.
+    """
+    _prefetch([(post, geometry_string) for post in posts
+               for geometry_string in post_geometries(post)],
+              settings.POST_THUMBNAIL_OPTIONS)
+
+
+def responsive_thumbnail(post):
+    """Основная миниатюра картинки поста и srcset из готовых размеров.
+
+    Возвращает {'src': миниатюра, 'srcset': строка} или None, пока
+    основная миниатюра не готова.
+    """
+    if not post.image:
+        return None
+    options = settings.POST_THUMBNAIL_OPTIONS
+    geometry_strings = post_geometries(post)
+    _prefetch([(post, geometry_string)
+               for geometry_string in geometry_strings
+               if _prefetch_key(geometry_string, options)
+               not in _prefetched(post)], options)
+    found = {geometry_string: _prefetched(post).get(
+        _prefetch_key(geometry_string, options))
+        for geometry_string in geometry_strings}
+    src = found[settings.POST_THUMBNAIL_DEFAULT]
+    if src is None:
+        return None
+    widths = sorted({thumbnail.width: thumbnail.url
+                     for thumbnail in found.values() if thumbnail}.items())
+    return {
+        'src': src,
+        'srcset': ', '.join(f'{url} {width}w' for width, url in widths),
+    }
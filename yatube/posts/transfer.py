@@ -0,0 +1,250 @@
+"""Выгрузка и загрузка контента в формате JSONL.
+
+Каждая строка — объект с полем type: group, post, comment или follow.
+Авторы указываются по username, группы — по slug, а посты и
+комментарии сохраняют свои id, чтобы комментарии ссылались на посты.
+Строки идут в порядке зависимостей: группы, посты, комментарии,
+подписки.
+
+Загрузка идёт порциями через bulk_create, мимо сигналов, поэтому
+счётчики, ссылки на картинки, версии кэша и ленты подписок каждая
+порция обновляет сама. Уже загруженные строки пропускаются, так что
+порцию можно повторить.
+"""
+import datetime
+import json
+from collections import Counter
+from contextlib import contextmanager
+
+from django.contrib.auth.hashers import make_password
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed
+from .models import Comment, Follow, Group, Post, User
+from .utils import batches
+from .versions import bump, scope
+
+EXPORTS = {
+    'group': (Group, {
+        'slug': 'slug',
+        'title': 'title',
+        'description': 'description',
+        'created': 'created',
+    }),
+    'post': (Post, {
+        'id': 'pk',
+        'author': 'author__username',
+        'group': 'group__slug',
+        'text': 'text',
+        'pub_date': 'pub_date',
+        'created': 'created',
+        'image': 'image',
+        'image_width': 'image_width',
+        'image_height': 'image_height',
+        'image_color': 'image_color',
+    }),
+    'comment': (Comment, {
+        'id': 'pk',
+        'post': 'post_id',
+        'author': 'author__username',
+        'text': 'text',
+        'created': 'created',
+    }),
+    'follow': (Follow, {
+        'user': 'user__username',
+        'author': 'author__username',
+        'created': 'created',
+    }),
+}
+KINDS = list(EXPORTS)
+
+
+class TransferError(ValueError):
+    pass
+
+
+class Encoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder округляет до миллисекунд, а порядок лент
+        # по pub_date должен сохраниться точно.
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def dumps(record):
+    return json.dumps(record, cls=Encoder, ensure_ascii=False)
+
+
+def export_records(kind, chunk_size):
+    """Записи одного типа по возрастанию pk, без загрузки всех в память."""
+    model, fields = EXPORTS[kind]
+    rows = (model.objects.order_by('pk').values_list(*fields.values())
+            .iterator(chunk_size=chunk_size))
+    for row in rows:
+        yield {'type': kind, **dict(zip(fields, row))}
+
+
+@contextmanager
+def original_dates(*models):
+    """Отключает auto_now_add, чтобы даты из файла не заменились текущими."""
+    fields = [field for model in models for field in model._meta.fields
+              if getattr(field, 'auto_now_add', False)]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _date(value):
+    return parse_datetime(value) if value else timezone.now()
+
+
+def user_ids(usernames):
+    """id пользователей по username; недостающие создаются без пароля."""
+    usernames = set(usernames)
+    found = dict(User.objects.filter(username__in=usernames)
+                 .values_list('username', 'pk'))
+    missing = usernames - set(found)
+    if missing:
+        User.objects.bulk_create(
+            User(username=name, password=make_password(None))
+            for name in missing)
+        found.update(User.objects.filter(username__in=missing)
+                     .values_list('username', 'pk'))
+    return found
+
+
+def group_ids(slugs):
+    slugs = set(slugs)
+    found = dict(Group.objects.filter(slug__in=slugs)
+                 .values_list('slug', 'pk'))
+    missing = slugs - set(found)
+    if missing:
+        raise TransferError('Нет групп: ' + ', '.join(sorted(missing)))
+    return found
+
+
+def _new_by_id(model, records):
+    ids = [record['id'] for record in records]
+    existing = set(model.objects.filter(pk__in=ids)
+                   .values_list('pk', flat=True))
+    return [record for record in records if record['id'] not in existing]
+
+
+def load_groups(records):
+    existing = set(Group.objects.filter(
+        slug__in=[record['slug'] for record in records])
+        .values_list('slug', flat=True))
+    new = {record['slug']: record for record in records
+           if record['slug'] not in existing}
+    with original_dates(Group):
+        Group.objects.bulk_create(
+            Group(slug=slug, title=record['title'],
+                  description=record['description'],
+                  created=_date(record.get('created')))
+            for slug, record in new.items())
+    if new:
+        bump(scope('index'))
+    return len(new)
+
+
+def load_posts(records):
+    new = _new_by_id(Post, records)
+    authors = user_ids(record['author'] for record in new)
+    groups = group_ids(
+        record['group'] for record in new if record.get('group'))
+    posts = []
+    for record in new:
+        pub_date = _date(record.get('pub_date'))
+        posts.append(Post(
+            pk=record['id'],
+            author_id=authors[record['author']],
+            group_id=groups.get(record.get('group')),
+            text=record['text'],
+            pub_date=pub_date,
+            created=_date(record.get('created') or record.get('pub_date')),
+            image=record.get('image') or '',
+            image_width=record.get('image_width'),
+            image_height=record.get('image_height'),
+            image_color=record.get('image_color') or '',
+        ))
+    with original_dates(Post):
+        Post.objects.bulk_create(posts)
+    followers = feed.fan_out_posts(posts)
+    by_author = Counter(post.author_id for post in posts)
+    for author_id, total in by_author.items():
+        counters.change_user_stats(author_id, posts_count=total)
+    for name, total in Counter(
+            post.image.name for post in posts if post.image).items():
+        counters.change_media_refs(name, total)
+    bump(scope('index'),
+         *(scope('author', author_id) for author_id in by_author),
+         *(scope('group', group_id) for group_id in groups.values()),
+         *(scope('feed', user_id) for user_id in followers))
+    return len(posts)
+
+
+def load_comments(records):
+    new = _new_by_id(Comment, records)
+    post_ids = {record['post'] for record in new}
+    missing = post_ids - set(Post.objects.filter(pk__in=post_ids)
+                             .values_list('pk', flat=True))
+    if missing:
+        raise TransferError(
+            'Нет постов: ' + ', '.join(map(str, sorted(missing))))
+    authors = user_ids(record['author'] for record in new)
+    with original_dates(Comment):
+        Comment.objects.bulk_create(
+            Comment(pk=record['id'], post_id=record['post'],
+                    author_id=authors[record['author']],
+                    text=record['text'],
+                    created=_date(record.get('created')))
+            for record in new)
+    by_post = Counter(record['post'] for record in new)
+    for post_id, total in by_post.items():
+        counters.change_comments_count(post_id, total)
+    bump(*(scope('post', post_id) for post_id in by_post))
+    return len(new)
+
+
+def load_follows(records):
+    users = user_ids(name for record in records
+                     for name in (record['user'], record['author']))
+    pairs = {(users[record['user']], users[record['author']]): record
+             for record in records if record['user'] != record['author']}
+    existing = set(Follow.objects.filter(
+        user_id__in={user_id for user_id, _ in pairs},
+        author_id__in={author_id for _, author_id in pairs},
+    ).values_list('user_id', 'author_id'))
+    new = {pair: record for pair, record in pairs.items()
+           if pair not in existing}
+    with original_dates(Follow):
+        Follow.objects.bulk_create(
+            Follow(user_id=user_id, author_id=author_id,
+                   created=_date(record.get('created')))
+            for (user_id, author_id), record in new.items())
+    followers = Counter(author_id for _, author_id in new)
+    following = Counter(user_id for user_id, _ in new)
+    for author_id, total in followers.items():
+        counters.change_user_stats(author_id, followers_count=total)
+    for user_id, total in following.items():
+        counters.change_user_stats(user_id, following_count=total)
+    for batch in batches(following, feed.BATCH_SIZE):
+        feed.rebuild_timelines(batch)
+    bump(*(scope('feed', user_id) for user_id in following),
+         *(scope('author', author_id) for author_id in followers))
+    return len(new)
+
+
+LOADERS = {
+    'group': load_groups,
+    'post': load_posts,
+    'comment': load_comments,
+    'follow': load_follows,
+}
@@ -7,6 +7,12 @@ urlpatterns = [
     path('', views.index, name='index'),
     path('group/<slug:slug>/', views.group_posts, name='group_list'),
     path('profile/<str:username>/', views.profile, name='profile'),
+    path('feeds/index.<str:fmt>', views.index_feed, name='index_feed'),
+    path('feeds/group/<slug:slug>.<str:fmt>', views.group_feed,
+         name='group_feed'),
+    path('feeds/profile/<str:username>.<str:fmt>', views.author_feed,
+         name='author_feed'),
+    path('search/', views.search, name='search'),
     path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
     path('create/', views.post_create, name='post_create'),
     path('posts/<int:post_id>/edit/', views.post_edit, name='post_edit'),
@@ -0,0 +1,41 @@
+from itertools import islice
+
+from django.conf import settings
+
+from core.paginator import CachedCountPaginator
+
+# Поля, которые выводят шаблоны лент; остальные не читаются из БД.
+LISTING_FIELDS = (
+    'text', 'pub_date', 'image', 'image_width', 'image_height', 'image_color',
+    'author', 'author__username', 'author__first_name', 'author__last_name',
+    'group', 'group__title', 'group__slug',
+)
+
+
+def for_listing(queryset):
+    """Загружает посты ленты вместе с автором и группой одним запросом."""
+    return queryset.select_related('author', 'group').only(*LISTING_FIELDS)
+
+
+def batches(iterable, size):
+    """Элементы iterable списками по size, не читая его целиком."""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def paginate(request, object_list, paginator_class=CachedCountPaginator,
+             **kwargs):
+    """Возвращает страницу ленты по ?cursor= или по номеру ?page=."""
+    if issubclass(paginator_class, CachedCountPaginator):
+        kwargs.setdefault('estimate_above',
+                          settings.PAGINATOR_ESTIMATE_THRESHOLD)
+        kwargs.setdefault('count_timeout', settings.FRAGMENT_CACHE_TIMEOUT)
+    paginator = paginator_class(object_list, settings.POSTS_COUNT, **kwargs)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_cursor_page(cursor)
+    return paginator.get_page(request.GET.get('page'))
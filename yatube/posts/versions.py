@@ -0,0 +1,114 @@
+"""Версии областей кэша для фрагментов шаблонов.
+
+Каждая область (общая лента, группа, автор, пост, лента подписок
+пользователя, счётчики подписок автора) хранит в кэше свою версию.
+Ключи фрагментов включают версии нужных областей, а запись в БД
+выдаёт области новую версию, поэтому фрагменты живут часами, но
+устаревают сразу после изменений.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import quote_etag
+
+from .feed import pulled_author_ids
+from .models import Follow
+
+KEY_PREFIX = 'version:'
+
+
+def scope(name, pk=None):
+    return name if pk is None else f'{name}:{pk}'
+
+
+def _new_version():
+    return uuid.uuid4().hex[:12]
+
+
+def version_map(*scopes):
+    """Версии областей {область: версия} одним обращением к кэшу."""
+    keys = {KEY_PREFIX + name: name for name in scopes}
+    found = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        found.update(missing)
+    return {name: found[key] for key, name in keys.items()}
+
+
+def versions(*scopes):
+    """Строка «область=версия» для ключа фрагмента."""
+    found = version_map(*scopes)
+    return ';'.join(f'{name}={found[name]}' for name in scopes)
+
+
+def bump(*scopes):
+    """Выдаёт областям новые версии одним обращением к кэшу."""
+    cache.set_many({KEY_PREFIX + name: _new_version() for name in scopes},
+                   timeout=None)
+
+
+def fragment_cache(*scopes):
+    """Контекст для {% cache cache_timeout имя cache_version ... %}."""
+    return {
+        'cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        'cache_version': versions(*scopes),
+    }
+
+
+def page_etag(request, *cache_versions):
+    """ETag страницы из версий её областей (строк versions()).
+
+    Шапка и формы страницы зависят от пользователя, а токен в формах —
+    от секрета CSRF, поэтому они тоже входят в ETag.
+    """
+    parts = list(cache_versions)
+    if request.user.is_authenticated:
+        parts += [str(request.user.pk),
+                  request.COOKIES.get(settings.CSRF_COOKIE_NAME, '')]
+    return quote_etag(hashlib.md5('|'.join(parts).encode()).hexdigest())
+
+
+def with_etag(response, etag):
+    response['ETag'] = etag
+    # Браузер кэширует страницу, но каждый раз сверяет ETag.
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def not_modified(request, etag):
+    """Ответ 304 (или 412), если страница у клиента не устарела."""
+    response = get_conditional_response(request, etag=etag)
+    return response and with_etag(response, etag)
+
+
+def page_scopes(post, group_ids=()):
+    """Области общих лент и страниц поста; без запросов к БД."""
+    group_ids = {*group_ids, post.group_id} - {None}
+    return [
+        scope('index'),
+        scope('author', post.author_id),
+        scope('post', post.pk),
+        *(scope('group', group_id) for group_id in group_ids),
+    ]
+
+
+def post_scopes(post, group_ids=()):
+    """Области всех лент, в которых виден пост, с лентами подписчиков."""
+    scopes = page_scopes(post, group_ids)
+    # Ленты с популярным автором зависят от версии самого автора.
+    if post.author_id in pulled_author_ids():
+        return scopes
+    followers = Follow.objects.filter(
+        author_id=post.author_id).values_list('user_id', flat=True)
+    return scopes + [scope('feed', user_id) for user_id in followers]
+
+
+def bump_post(post, group_ids=()):
+    """Сбрасывает все ленты, в которых виден пост."""
+    bump(*post_scopes(post, group_ids))
@@ -1,65 +1,137 @@
-from django.core.paginator import Paginator
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import IntegrityError, transaction
 from django.shortcuts import render, get_object_or_404, redirect
 from .models import Post, Group, User, Follow
-from django.conf import settings
+from .counters import user_stats
+from .feed import FeedPaginator, follow_feed, pulled_follows
 from .forms import PostForm, CommentForm
+from .search import SearchPaginator
+from .syndication import feed_response
+from .thumbnails import pregenerate
+from .utils import for_listing, paginate
+from .versions import (fragment_cache, not_modified, page_etag, scope,
+                       versions, with_etag)
 from django.urls import reverse
 
 
 def index(request):
-    posts = Post.objects.all()
-    paginator = Paginator(posts, settings.POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    posts = for_listing(Post.objects.all())
+    fragment = fragment_cache(scope('index'))
+    page_obj = paginate(request, posts, count_key=fragment['cache_version'])
     context = {
         'page_obj': page_obj,
+        **fragment,
     }
     return render(request, 'posts/index.html', context)
 
 
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.all()
-    paginator = Paginator(posts, settings.POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    fragment = fragment_cache(scope('group', group.pk))
+    # Неизменившаяся страница не выбирает посты и не рендерится.
+    etag = page_etag(request, fragment['cache_version'])
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    posts = for_listing(group.posts.all())
+    page_obj = paginate(request, posts, count_key=fragment['cache_version'])
     context = {
         'group': group,
         'posts': posts,
         'page_obj': page_obj,
+        **fragment,
     }
-    return render(request, 'posts/group_list.html', context)
+    return with_etag(render(request, 'posts/group_list.html', context), etag)
 
 
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    post_list = author.posts.all()
-    paginator = Paginator(post_list, settings.POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    posts_count = author.posts.count()
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    fragment = fragment_cache(scope('author', author.pk))
+    # Подписчики и подписки автора — в своей области author-stats.
+    etag = page_etag(request, fragment['cache_version'],
+                     versions(scope('author-stats', author.pk)))
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    post_list = for_listing(author.posts.all())
+    stats = user_stats(author)
+    page_obj = paginate(request, post_list, count=stats.posts_count,
+                        count_key=fragment['cache_version'])
     context = {
         'author': author,
         'page_obj': page_obj,
         'posts': post_list,
-        'posts_count': posts_count,
+        'posts_count': stats.posts_count,
+        'stats': stats,
+        **fragment,
+    }
+    return with_etag(render(request, 'posts/profile.html', context), etag)
+
+
+def index_feed(request, fmt):
+    return feed_response(
+        request, fmt, for_listing(Post.objects.all()), scope('index'),
+        title='Yatube: последние обновления', link=reverse('posts:index'),
+        description='Новые посты на сайте Yatube')
+
+
+def group_feed(request, slug, fmt):
+    group = get_object_or_404(Group, slug=slug)
+    return feed_response(
+        request, fmt, for_listing(group.posts.all()),
+        scope('group', group.pk), title=f'Yatube: {group.title}',
+        link=reverse('posts:group_list', args=[group.slug]),
+        description=group.description)
+
+
+def author_feed(request, username, fmt):
+    author = get_object_or_404(User, username=username)
+    return feed_response(
+        request, fmt, for_listing(author.posts.all()),
+        scope('author', author.pk),
+        title=f'Yatube: {author.get_full_name() or author.username}',
+        link=reverse('posts:profile', args=[author.username]),
+        description=f'Посты пользователя {author.username}')
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    paginator = SearchPaginator(query, settings.POSTS_COUNT,
+                                rank_window=settings.SEARCH_RANK_WINDOW)
+    page_obj = paginator.get_cursor_page(request.GET.get('cursor'))
+    context = {
+        'query': query,
+        'page_obj': page_obj,
     }
-    return render(request, 'posts/profile.html', context)
+    return render(request, 'posts/search.html', context)
 
 
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
-    posts_count = post.author.posts.count()
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
+    fragment = fragment_cache(scope('post', post.pk))
+    # Число постов автора меняет его версию, название группы — её.
+    scopes = [scope('author', post.author_id)]
+    if post.group_id:
+        scopes.append(scope('group', post.group_id))
+    etag = page_etag(request, fragment['cache_version'], versions(*scopes))
+    unchanged = not_modified(request, etag)
+    if unchanged:
+        return unchanged
+    posts_count = user_stats(post.author).posts_count
     form = CommentForm()
-    comments = post.comments.all()
+    comments = post.comments.select_related('author')
     context = {
         'post': post,
         'form': form,
         'posts_count': posts_count,
-        'comments': comments
+        'comments': comments,
+        **fragment,
     }
-    return render(request, 'posts/post_detail.html', context)
+    return with_etag(render(request, 'posts/post_detail.html', context),
+                     etag)
 
 
 @login_required
@@ -72,6 +144,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        pregenerate(post)
         return redirect('posts:profile', post.author.username)
     return render(request, 'posts/post_create.html', {'form': form})
 
@@ -88,7 +161,9 @@ def post_edit(request, post_id):
     if post.author != request.user:
         return redirect('posts:post_detail', post.id)
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            pregenerate(post)
         return redirect('posts:post_detail', post_id)
     context = {
         'is_edit': is_edit,
@@ -115,13 +190,14 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    follows = Follow.objects.filter(user=request.user)
-    post_list = Post.objects.filter(author__in=follows.values('author'))
-    paginator = Paginator(post_list, settings.POSTS_COUNT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    pulled = pulled_follows(request.user)
+    page_obj = paginate(
+        request, follow_feed(request.user, pulled), FeedPaginator)
     context = {
         'page_obj': page_obj,
+        **fragment_cache(
+            scope('feed', request.user.pk),
+            *(scope('author', author_id) for author_id in pulled)),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -130,9 +206,13 @@ def follow_index(request):
 def profile_follow(request, username):
     user = request.user
     author = get_object_or_404(User, username=username)
-    is_follower = Follow.objects.filter(user=user, author=author)
-    if user != author and not is_follower.exists():
-        Follow.objects.create(user=user, author=author)
+    if user != author:
+        # Повторная подписка упирается в unique_follow и игнорируется.
+        try:
+            with transaction.atomic():
+                Follow.objects.create(user=user, author=author)
+        except IntegrityError:
+            pass
     return redirect(reverse('posts:profile', args=[username]))
 
 
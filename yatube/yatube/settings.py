@@ -48,6 +48,7 @@ INSTALLED_APPS = [
     'users.apps.UsersConfig',
     'core.apps.CoreConfig',
     'about.apps.AboutConfig',
+    'api.apps.ApiConfig',
     'sorl.thumbnail',
     'debug_toolbar',
 ]
@@ -140,6 +141,47 @@ USE_TZ = True
 STATIC_URL = '/static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, 'static')]
 POSTS_COUNT = 10
+# Постов в одном окне ленты RSS, Atom и JSON Feed
+FEED_POSTS_COUNT = 20
+# Размер окна списков API по умолчанию и наибольший (?limit=)
+API_PAGE_SIZE = 20
+API_MAX_PAGE_SIZE = 100
+# Наибольшее число постов в одном запросе /api/v1/posts/batch/
+API_BATCH_SIZE = 100
+# Сколько последних постов хранится в ленте подписок пользователя;
+# лишние удаляет команда trim_timelines, запускаемая по расписанию
+FOLLOW_TIMELINE_LENGTH = 1000
+# Посты авторов с таким числом подписчиков не раскладываются по лентам,
+# а подмешиваются при чтении; список таких авторов кэшируется (секунды)
+FEED_PULL_THRESHOLD = 10000
+FEED_PULL_CACHE_TIMEOUT = 300
+# Фрагменты лент сбрасываются версиями при записи, а не по таймауту
+FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 6
+# Для таблицы больше этого числа строк паджинатор берёт оценку из
+# статистики СУБД вместо COUNT(*)
+PAGINATOR_ESTIMATE_THRESHOLD = 100000
+# Поиск ранжирует по bm25 только столько самых свежих совпадений
+SEARCH_RANK_WINDOW = 10000
+# Миниатюры картинок постов для srcset в includes/post_image.html:
+# нарезаются в фоне сразу после загрузки, все за одно декодирование.
+# Размеры больше исходной картинки не нарезаются, кроме основного,
+# который идёт в src
+POST_THUMBNAIL_SIZES = ['480x170', '960x339', '1440x508', '1920x678']
+POST_THUMBNAIL_DEFAULT = '960x339'
+POST_THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# Предел объёма миниатюр в байтах (None — без предела) и срок, после
+# которого неоткрывавшиеся миниатюры удаляются; см. collect_media
+THUMBNAIL_STORAGE_LIMIT = 10 * 2**30
+THUMBNAIL_MAX_IDLE = 30 * 24 * 60 * 60
+# Потоков для нарезки миниатюр; 0 — нарезать прямо в запросе
+THUMBNAIL_WORKERS = 2
+# Загруженные картинки уменьшаются до IMAGE_MAX_EDGE по длинной стороне
+# и перекодируются без EXIF в пуле процессов (0 — прямо в запросе)
+IMAGE_MAX_EDGE = 2048
+IMAGE_MAX_PIXELS = 50_000_000
+IMAGE_INGEST_FORMAT = 'JPEG'
+IMAGE_INGEST_QUALITY = 85
+IMAGE_INGEST_WORKERS = 2
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -159,9 +201,35 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+# MEDIA_URL отдаёт core.views.serve_media. MEDIA_OFFLOAD передаёт
+# отдачу фронтенду: 'x-accel-redirect' — nginx из internal-локации
+# MEDIA_ACCEL_PREFIX, 'x-sendfile' — Apache и lighttpd; None — сам
+# Django через FileResponse
+MEDIA_OFFLOAD = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Версии областей кэша (сброс фрагментов, ETag, кэш лент и счётчиков)
+# живут в кэше и должны быть общими для всех процессов. В проде задайте
+# CACHE_LOCATION — адрес memcached (нужен пакет python-memcached).
+# Без него используется LocMemCache: он годится только для одного
+# процесса (runserver, один воркер), потому что у каждого воркера свой
+# кэш и остальные не увидят сброса до истечения FRAGMENT_CACHE_TIMEOUT.
+# Файловый кэш не подходит: он просматривает каталог при каждой записи
+CACHE_LOCATION = os.environ.get('CACHE_LOCATION')
+if CACHE_LOCATION:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.MemcachedCache',
+            'LOCATION': CACHE_LOCATION,
+        }
     }
-}
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+# Тесты получают свой кэш, см. core.testing.TestRunner
+TEST_RUNNER = 'core.testing.TestRunner'